@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppRunConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_run'
+
+    def ready(self):
+        # Регистрируем обработчики фоновых задач, сигналы инвалидации кеша ответов и таблиц лидеров
+        from . import challenges, imports, leaderboards, track, response_cache  # noqa: F401
@@ -0,0 +1,149 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Callable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Min, Window
+from django.db.models.functions import RowNumber
+
+from .jobs import job
+from .leaderboards import is_athlete
+from .models import Run, Challenge, UserStats
+from .rollups import add_run
+from .response_cache import CACHE_TIMEOUT, bump_model_versions, model_versions
+
+# Как каждый счетчик UserStats меняется при завершении забега. Счетчики обновляются по порядку,
+# поэтому avg_speed видит уже обновленные runs_finished и speed_sum
+COUNTERS = {
+    'runs_finished': lambda stats, run: stats.runs_finished + 1,
+    'total_distance': lambda stats, run: stats.total_distance + (run.distance or 0.0),
+    'max_distance': lambda stats, run: max(stats.max_distance, run.distance or 0.0),
+    'speed_sum': lambda stats, run: stats.speed_sum + (run.speed or 0.0),
+    'avg_speed': lambda stats, run: stats.speed_sum / stats.runs_finished,
+}
+COUNTER_DEPENDENCIES = {'avg_speed': ('runs_finished', 'speed_sum')}
+
+# Счетчики, которые читаются не только правилами: список пользователей (runs_finished) и таблицы лидеров
+READ_COUNTERS = ('runs_finished', 'total_distance', 'max_distance', 'avg_speed')
+
+
+@dataclass(frozen=True)
+class ChallengeRule:
+    full_name: str
+    counters: tuple  # Счетчики UserStats, которые нужны правилу
+    check: Callable  # check(stats, run) -> bool, stats уже учитывает завершенный забег
+
+
+RULES = []
+
+
+def challenge(full_name, counters=()):
+    # Регистрирует правило челленджа. Новый челлендж - это новая функция с этим декоратором,
+    # счетчики для нее поддерживаются инкрементально, без пересчета всей истории забегов
+    unknown = set(counters) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f'Unknown counters: {", ".join(sorted(unknown))}')
+
+    def decorator(check):
+        RULES.append(ChallengeRule(full_name, tuple(counters), check))
+        return check
+
+    return decorator
+
+
+def maintained_counters():
+    # Обновляем только счетчики, нужные правилам и читателям UserStats, вместе с их зависимостями,
+    # в порядке COUNTERS
+    needed = set(READ_COUNTERS).union(*(rule.counters for rule in RULES))
+    while True:
+        expanded = needed.union(*(COUNTER_DEPENDENCIES.get(counter, ()) for counter in needed))
+        if expanded == needed:
+            break
+        needed = expanded
+
+    return [counter for counter in COUNTERS if counter in needed]
+
+
+@challenge('Сделай 10 Забегов!', counters=('runs_finished',))
+def ten_runs(stats, run):
+    return stats.runs_finished == 10
+
+
+@challenge('Пробеги 50 километров!', counters=('total_distance',))
+def fifty_kilometers(stats, run):
+    return stats.total_distance >= 50
+
+
+@challenge('2 километра за 10 минут!')
+def two_kilometers_in_ten_minutes(stats, run):
+    return run.distance >= 2 and run.run_time_seconds <= 600
+
+
+def process_finished_run(run):
+    # Обновляем счетчики атлета и выдаем челленджи: одно индексное чтение строки UserStats и одна запись
+    with transaction.atomic():
+        stats, _ = UserStats.objects.select_for_update().get_or_create(
+            user_id=run.athlete_id, defaults={'is_athlete': is_athlete(run.athlete)})
+        counters = maintained_counters()
+        for counter in counters:
+            setattr(stats, counter, COUNTERS[counter](stats, run))
+        stats.save(update_fields=counters)
+
+        awarded = [rule.full_name for rule in RULES if rule.check(stats, run)]
+        if awarded:
+            existing = set(Challenge.objects.filter(athlete_id=run.athlete_id, full_name__in=awarded)
+                           .values_list('full_name', flat=True))
+            created = Challenge.objects.bulk_create([Challenge(athlete_id=run.athlete_id, full_name=full_name)
+                                                     for full_name in awarded if full_name not in existing])
+            if created:
+                bump_model_versions(Challenge)
+
+    return stats
+
+
+def challenges_summary(name=None, offset=0, size=100):
+    # Сводка "челлендж -> атлеты" с постраничным списком атлетов в каждом челлендже. Группировка и нумерация
+    # атлетов внутри челленджа выполняются в базе оконными функциями, из базы читается не больше size строк
+    # на челлендж. Результат кешируется под версией модели Challenge, то есть до выдачи следующего челленджа
+    version, = model_versions([Challenge])
+    name_key = hashlib.md5(name.encode()).hexdigest() if name is not None else ''  # Имя может содержать пробелы
+    key = f'challenges_summary:{version}:{name_key}:{offset}:{size}'
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    challenges = Challenge.objects.all()
+    if name is not None:
+        challenges = challenges.filter(full_name=name)
+
+    partition = {'partition_by': F('full_name')}
+    rows = (challenges
+            .annotate(position=Window(RowNumber(), order_by=F('id').asc(), **partition),
+                      athletes_count=Window(Count('id'), **partition),
+                      first_id=Window(Min('id'), **partition))
+            .filter(position__gt=offset, position__lte=offset + size)
+            .order_by('first_id', 'position')
+            .values('full_name', 'athletes_count', 'athlete_id', 'athlete__first_name', 'athlete__last_name',
+                    'athlete__username'))
+
+    summary = {}
+    for row in rows:
+        summary.setdefault(row['full_name'], {'name_to_display': row['full_name'],
+                                              'athletes_count': row['athletes_count'],
+                                              'athletes': []})['athletes'].append({
+            'id': row['athlete_id'],
+            'full_name': f'{row["athlete__first_name"]} {row["athlete__last_name"]}',
+            'username': row['athlete__username']
+        })
+
+    result = list(summary.values())
+    cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+@job('run_finished')
+def run_finished_job(job):
+    run = Run.objects.select_related('athlete').get(pk=job.payload['run_id'])
+    process_finished_run(run)
+    add_run(run)
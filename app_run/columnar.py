@@ -0,0 +1,141 @@
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+
+from .models import Position
+from .renderers import FastJSONRenderer
+
+PACKED_MAGIC = b'RTRK'
+PACKED_VERSION = 2  # 2: смещения времени int64 вместо int32, иначе трек длиннее ~24.8 дня не упаковывался
+PACKED_HEADER = struct.Struct('<4sHIq')  # magic, версия, количество точек, начало трека в мс от эпохи (-1 - нет)
+PACKED_NO_TIME = -1  # Смещение для точки без времени
+
+# Бинарный формат пакетной загрузки точек: заголовок PACKED_BATCH_HEADER, затем count записей PACKED_BATCH_RECORD
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+PACKED_BATCH_MAGIC = b'RPOS'
+PACKED_BATCH_VERSION = 1
+PACKED_BATCH_HEADER = struct.Struct('<4sHQIq')  # magic, версия, id забега, количество точек, начало в мс от эпохи
+PACKED_BATCH_RECORD = struct.Struct('<iii')  # широта и долгота * 10000, смещение времени от начала в мс
+COORDINATE_SCALE = 10000  # Координаты хранятся с 4 знаками после запятой, поэтому передаются целыми числами
+
+
+def track_columns(run_id):
+    # Весь трек забега одним упорядоченным запросом в виде параллельных массивов. Время точки - смещение
+    # в миллисекундах от первой точки, поэтому ключи и полные даты не повторяются для каждой точки
+    rows = list(Position.objects.filter(run_id=run_id).order_by('date_time', 'id')
+                .values_list('id', 'latitude', 'longitude', 'date_time', 'speed', 'distance'))
+    start = min((row[3] for row in rows if row[3] is not None), default=None)
+
+    return {
+        'run': int(run_id),
+        'start': start,  # В JSON - строка ISO 8601, в бинарном формате - миллисекунды от эпохи
+        'count': len(rows),
+        'id': [row[0] for row in rows],
+        'latitude': [float(row[1]) for row in rows],
+        'longitude': [float(row[2]) for row in rows],
+        'time_offset': [round((row[3] - start).total_seconds() * 1000) if row[3] else None for row in rows],
+        'speed': [row[4] for row in rows],
+        'distance': [row[5] for row in rows],
+    }
+
+
+class ColumnarTrackRenderer(FastJSONRenderer):
+    # ?format=columnar: трек забега параллельными массивами в JSON
+    format = 'columnar'
+
+
+class PackedTrackRenderer(BaseRenderer):
+    # ?format=packed: тот же трек в бинарном виде, little-endian. Заголовок PACKED_HEADER, затем массивы
+    # по count значений: latitude, longitude (float32), time_offset (int64, мс), speed, distance (float32)
+    media_type = 'application/octet-stream'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        count = data['count']
+        start = round(data['start'].timestamp() * 1000) if data['start'] else PACKED_NO_TIME
+
+        return b''.join((
+            PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, count, start),
+            struct.pack(f'<{count}f', *data['latitude']),
+            struct.pack(f'<{count}f', *data['longitude']),
+            struct.pack(f'<{count}q', *(PACKED_NO_TIME if offset is None else offset
+                                        for offset in data['time_offset'])),
+            struct.pack(f'<{count}f', *data['speed']),
+            struct.pack(f'<{count}f', *data['distance']),
+        ))
+
+
+TRACK_RENDERERS = (ColumnarTrackRenderer, PackedTrackRenderer)
+
+
+class ColumnarTrackMixin:
+    # Для PositionViewSet: ?run=<id>&format=columnar|packed отдает весь трек забега одним ответом без пагинации
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action != 'list':
+            renderers = [renderer for renderer in renderers if not isinstance(renderer, TRACK_RENDERERS)]
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, TRACK_RENDERERS):
+            return super().list(request, *args, **kwargs)
+
+        run_id = request.query_params.get('run')
+        if not run_id or not run_id.isdigit():
+            # Ошибку отдаем обычным JSON, а не в формате трека
+            request.accepted_renderer, request.accepted_media_type = FastJSONRenderer(), FastJSONRenderer.media_type
+            return Response({'error': 'Track formats require ?run=<id>'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(track_columns(run_id))
+
+
+@dataclass
+class PackedPositionBatch:
+    # Пакет точек, разобранный из бинарного формата в столбцы
+    run_id: int
+    start: datetime
+    latitudes: tuple  # * COORDINATE_SCALE
+    longitudes: tuple  # * COORDINATE_SCALE
+    time_offsets: tuple  # мс от start
+
+    def __len__(self):
+        return len(self.latitudes)
+
+
+class PackedPositionBatchParser(BaseParser):
+    # Разбирает весь пакет одним struct.unpack: записи фиксированной длины раскладываются в столбцы срезами,
+    # без разбора дат и Decimal для каждой точки
+    media_type = 'application/x-packed-positions'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        payload = stream.read() if stream else b''
+        if len(payload) < PACKED_BATCH_HEADER.size:
+            raise ParseError('Packed batch is shorter than its header')
+
+        magic, version, run_id, count, start = PACKED_BATCH_HEADER.unpack_from(payload)
+        if magic != PACKED_BATCH_MAGIC or version != PACKED_BATCH_VERSION:
+            raise ParseError('Unknown packed batch format')
+        if len(payload) != PACKED_BATCH_HEADER.size + count * PACKED_BATCH_RECORD.size:
+            raise ParseError(f'Packed batch length does not match {count} records')
+
+        values = struct.unpack_from(f'<{count * 3}i', payload, PACKED_BATCH_HEADER.size)
+        time_offsets = values[2::3]
+        try:
+            start = EPOCH + timedelta(milliseconds=start)
+            # Время всех точек лежит между крайними смещениями, поэтому проверяем только их
+            if time_offsets:
+                start + timedelta(milliseconds=min(time_offsets))
+                start + timedelta(milliseconds=max(time_offsets))
+        except (OverflowError, ValueError):
+            raise ParseError('Packed batch time is out of range')
+
+        return PackedPositionBatch(run_id=run_id, start=start,
+                                   latitudes=values[0::3], longitudes=values[1::3], time_offsets=time_offsets)
@@ -0,0 +1,71 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+from rest_framework.response import Response
+
+from .models import Run
+
+# Версия ресурса для условного GET - все, от чего зависит ответ. Из нее строится ETag. Last-Modified не отдаем:
+# updated_at хранится с точностью до секунды и не меняется при удалениях, поэтому If-Modified-Since мог бы
+# ответить 304 на устаревшие данные. Завершенные забеги и их точки тоже можно изменить и удалить через API,
+# поэтому immutable ответы не помечаются
+
+
+def runs_version(runs, next_link, previous_link):
+    # Версия страницы списка забегов: id, updated_at и имя атлета (athlete_data) каждого забега страницы
+    # и ссылки на соседние страницы. Строится по той же странице, что и ответ: O(размер страницы),
+    # без COUNT и MAX по всей выборке
+    return ([(run.id, run.updated_at, run.athlete.username, run.athlete.first_name, run.athlete.last_name)
+             for run in runs], next_link, previous_link)
+
+
+def run_version(run):
+    # Ответ содержит имя атлета (athlete_data), поэтому оно входит в версию
+    athlete = run.athlete
+    return run.id, run.updated_at, athlete.username, athlete.first_name, athlete.last_name
+
+
+def positions_version(run_id):
+    # Версия точек забега хранится в самом забеге, поэтому трек целиком не читаем
+    run = Run.objects.filter(pk=run_id).values('id', 'positions_version').first()
+    if run is None:
+        return None
+
+    return run['id'], run['positions_version']
+
+
+class ConditionalGetMixin:
+    # Для ViewSet: отвечает 304 на If-None-Match, не вызывая сериализатор.
+    # Версию ресурса задают get_list_version и get_object_version (None - условный GET не поддерживается)
+    def get_list_version(self, queryset):
+        return None
+
+    def get_object_version(self, instance):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        version = self.get_list_version(self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(request, version, lambda: super(ConditionalGetMixin, self).list(
+            request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(request, self.get_object_version(instance),
+                                         lambda: Response(self.get_serializer(instance).data))
+
+    def conditional_response(self, request, version, build_response):
+        if version is None:
+            return build_response()
+
+        # Ответ зависит еще и от query-параметров (курсор, size, фильтры) и выбранного формата
+        raw = ':'.join(str(part) for part in (version, request.get_full_path(), request.accepted_renderer.format))
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = build_response()
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)  # Кешировать можно, но только с перепроверкой
+        patch_vary_headers(response, ['Accept'])
+        return response
@@ -0,0 +1,102 @@
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .serializers import RunSerializer, UserSerializer, PositionSerializer
+
+
+class ValuesSerializer:
+    # Быстрая сериализация списков только для чтения: строки берутся из queryset.values(), а значения приводятся
+    # методами to_representation полей исходного сериализатора. Поэтому вывод совпадает с serializer_class
+    # байт в байт, но без создания сериализатора и вызова get_attribute для каждого объекта
+    serializer_class = None
+    computed = {}  # SerializerMethodField: имя поля -> (поле в values(), функция от его значения)
+
+    @cached_property
+    def mapping(self):
+        # Схема вывода компилируется один раз: [(имя поля, поле в values(), функция или вложенная схема)]
+        return self.compile(self.serializer_class(), '')
+
+    @cached_property
+    def lookups(self):
+        lookups = []
+
+        def collect(mapping):
+            for _, lookup, convert in mapping:
+                if isinstance(convert, list):
+                    collect(convert)
+                else:
+                    lookups.append(lookup)
+
+        collect(self.mapping)
+        return lookups
+
+    def compile(self, serializer, prefix):
+        mapping = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if not prefix and name in self.computed:
+                lookup, convert = self.computed[name]
+                mapping.append((name, lookup, convert))
+            elif isinstance(field, serializers.BaseSerializer):
+                mapping.append((name, None, self.compile(field, f'{prefix}{field.source}__')))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                # values() уже возвращает id связанного объекта
+                mapping.append((name, prefix + field.source, int))
+            elif isinstance(field, serializers.SerializerMethodField):
+                raise ImproperlyConfigured(f'{type(self).__name__}.computed should describe field {name!r}')
+            else:
+                mapping.append((name, prefix + field.source.replace('.', '__'), field.to_representation))
+        return mapping
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def build(self, mapping, row):
+        # Как Serializer.to_representation: None выводится как есть, без приведения
+        data = {}
+        for name, lookup, convert in mapping:
+            if isinstance(convert, list):
+                data[name] = self.build(convert, row)
+            else:
+                value = row[lookup]
+                data[name] = None if value is None else convert(value)
+        return data
+
+    def serialize(self, rows):
+        mapping = self.mapping
+        return [self.build(mapping, row) for row in rows]
+
+
+class RunValuesSerializer(ValuesSerializer):
+    serializer_class = RunSerializer
+
+
+class UserValuesSerializer(ValuesSerializer):
+    serializer_class = UserSerializer
+    computed = {'type': ('is_staff', lambda is_staff: 'coach' if is_staff else 'athlete')}
+
+
+class PositionValuesSerializer(ValuesSerializer):
+    serializer_class = PositionSerializer
+
+
+class FastListMixin:
+    # Для ViewSet: при FAST_LIST_SERIALIZATION = True list сериализуется через values_serializer
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_LIST_SERIALIZATION or self.values_serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = self.values_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)  # CursorPagination умеет брать позицию курсора из словаря
+        if page is not None:
+            return self.get_paginated_response(self.values_serializer.serialize(page))
+
+        return Response(self.values_serializer.serialize(rows))
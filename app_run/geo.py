@@ -0,0 +1,47 @@
+import math
+
+from geographiclib.geodesic import Geodesic
+
+# Сетка для пространственного индекса CollectibleItem: ячейка - квадрат CELL_SIZE x CELL_SIZE градусов
+CELL_SIZE = 0.01  # ~1.1 км по широте
+METERS_PER_DEGREE = 111320  # Длина одного градуса широты в метрах
+
+
+def grid_cell(latitude, longitude):
+    # Номер ячейки сетки (lat_cell, lon_cell), в которую попадает точка
+    return math.floor(float(latitude) / CELL_SIZE), math.floor(float(longitude) / CELL_SIZE)
+
+
+def bounding_box(latitude, longitude, radius):
+    # Прямоугольник (min_lat, max_lat, min_lon, max_lon), гарантированно содержащий круг радиуса radius метров
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = radius / METERS_PER_DEGREE
+    # У полюсов градус долготы стремится к нулю, поэтому ограничиваем косинус снизу
+    lon_delta = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+
+    return (max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0),
+            max(longitude - lon_delta, -180.0), min(longitude + lon_delta, 180.0))
+
+
+def cell_ranges(latitude, longitude, radius):
+    # Диапазоны номеров ячеек ((min_lat_cell, max_lat_cell), (min_lon_cell, max_lon_cell)),
+    # которые пересекает круг радиуса radius метров вокруг точки
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius)
+    min_lat_cell, min_lon_cell = grid_cell(min_lat, min_lon)
+    max_lat_cell, max_lon_cell = grid_cell(max_lat, max_lon)
+
+    return (min_lat_cell, max_lat_cell), (min_lon_cell, max_lon_cell)
+
+
+def cells_around(latitude, longitude, radius):
+    # Все ячейки сетки, которые пересекает круг радиуса radius метров вокруг точки
+    (min_lat_cell, max_lat_cell), (min_lon_cell, max_lon_cell) = cell_ranges(latitude, longitude, radius)
+
+    return {(lat_cell, lon_cell)
+            for lat_cell in range(min_lat_cell, max_lat_cell + 1)
+            for lon_cell in range(min_lon_cell, max_lon_cell + 1)}
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    # Расстояние по эллипсоиду WGS-84, как у geopy.geodesic
+    return Geodesic.WGS84.Inverse(float(lat1), float(lon1), float(lat2), float(lon2), Geodesic.DISTANCE)['s12']
@@ -0,0 +1,111 @@
+from io import BytesIO
+from itertools import islice
+
+import openpyxl
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .geo import grid_cell
+from .jobs import checkpoint, job
+from .models import CollectibleItem, ImportJob, ImportInvalidRow
+from .response_cache import bump_model_versions
+from .serializers import CollectibleItemImportSerializer
+from .track import enqueue_collectible_matching
+
+IMPORT_CHUNK_SIZE = 1000  # Сколько строк проверяем и вставляем за один раз
+IMPORT_COLUMNS = ['name', 'uid', 'value', 'latitude', 'longitude', 'picture']
+
+
+def read_xlsx_rows(upload_file):
+    # Потоковое чтение активного листа без загрузки всего файла в память. Первая строка - заголовок
+    wb = openpyxl.load_workbook(upload_file, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(min_row=2, values_only=True)
+    finally:
+        wb.close()
+
+
+def last_item_id():
+    return CollectibleItem.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+
+def import_collectible_items(rows, on_chunk=None, items_after=None):
+    # Проверяет строки пачками по IMPORT_CHUNK_SIZE и вставляет корректные одним bulk_create на пачку.
+    # on_chunk(processed, inserted, invalid_rows) вызывается в той же транзакции, что и вставка пачки.
+    # После импорта все предметы с id > items_after одной задачей сопоставляются с сохраненными точками.
+    # Возвращает список некорректных строк и количество вставленных предметов
+    if items_after is None:
+        items_after = last_item_id()
+    invalid_rows = []
+    inserted = 0
+    seen_uids = set()  # Для отслеживания дубликатов uid внутри файла
+    rows = iter(rows)
+
+    while chunk := list(islice(rows, IMPORT_CHUNK_SIZE)):
+        validated = []
+        for row in chunk:
+            values = (tuple(row) + (None,) * len(IMPORT_COLUMNS))[:len(IMPORT_COLUMNS)]
+            serializer = CollectibleItemImportSerializer(data=dict(zip(IMPORT_COLUMNS, values)))
+            validated.append((row, serializer.validated_data if serializer.is_valid() else None))
+
+        # Уже существующие в базе uid проверяем одним запросом на всю пачку
+        existing_uids = set(CollectibleItem.objects
+                            .filter(uid__in=[data['uid'] for _, data in validated if data])
+                            .values_list('uid', flat=True))
+
+        items = []
+        chunk_invalid_rows = []
+        for row, data in validated:
+            if data is None or data['uid'] in existing_uids or data['uid'] in seen_uids:
+                chunk_invalid_rows.append(list(row))
+                continue
+
+            seen_uids.add(data['uid'])
+            lat_cell, lon_cell = grid_cell(data['latitude'], data['longitude'])  # bulk_create не вызывает save()
+            items.append(CollectibleItem(lat_cell=lat_cell, lon_cell=lon_cell, **data))
+
+        with transaction.atomic():
+            CollectibleItem.objects.bulk_create(items, ignore_conflicts=True)
+            bump_model_versions(CollectibleItem)
+            if on_chunk:
+                on_chunk(len(chunk), len(items), chunk_invalid_rows)
+
+        inserted += len(items)
+        invalid_rows += chunk_invalid_rows
+
+    max_item_id = last_item_id()
+    if max_item_id > items_after:
+        enqueue_collectible_matching(items_after + 1, max_item_id)
+
+    return invalid_rows, inserted
+
+
+@job('import_collectible_items', atomic=False)
+def import_collectible_items_job(job):
+    # Прогресс сохраняется после каждой пачки, поэтому повтор после сбоя продолжает с первой необработанной строки
+    import_job = ImportJob.objects.get(pk=job.payload['import_job_id'])
+    ImportJob.objects.filter(pk=import_job.pk).update(status='running')
+    if 'items_after' not in job.payload:
+        # Граница запоминается при первом запуске, чтобы повтор сопоставил и предметы из уже обработанных пачек
+        checkpoint(job, items_after=last_item_id())
+
+    def save_progress(processed, inserted, invalid_rows):
+        ImportInvalidRow.objects.bulk_create([ImportInvalidRow(job=import_job, row=row) for row in invalid_rows])
+        ImportJob.objects.filter(pk=import_job.pk).update(rows_processed=F('rows_processed') + processed,
+                                                          rows_inserted=F('rows_inserted') + inserted,
+                                                          invalid_rows_count=F('invalid_rows_count') + len(invalid_rows))
+        # Продлеваем блокировку задачи, иначе долгий импорт заберет второй воркер и обработает файл повторно
+        checkpoint(job)
+
+    try:
+        rows = islice(read_xlsx_rows(BytesIO(import_job.file)), import_job.rows_processed, None)
+        import_collectible_items(rows, on_chunk=save_progress, items_after=job.payload['items_after'])
+    except Exception as exc:
+        if job.attempts >= job.max_attempts:
+            ImportJob.objects.filter(pk=import_job.pk).update(status='failed', error=str(exc),
+                                                              finished_at=timezone.now())
+        raise
+
+    # Файл после импорта больше не нужен
+    ImportJob.objects.filter(pk=import_job.pk).update(status='done', file=b'', finished_at=timezone.now())
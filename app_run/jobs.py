@@ -0,0 +1,127 @@
+import logging
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = timedelta(minutes=10)  # Через сколько задачу упавшего воркера можно забрать снова
+MAX_RETRY_DELAY = 600  # Максимальная пауза между повторами в секундах
+
+HANDLERS = {}
+
+
+def job(kind, atomic=True):
+    # Регистрирует обработчик задачи. При atomic=True обработчик и отметка о выполнении идут одной транзакцией,
+    # поэтому повтор после сбоя не применит побочные эффекты дважды. Обработчики с atomic=False сами отвечают
+    # за идемпотентность (например, сохраняют прогресс через checkpoint)
+    def decorator(handler):
+        HANDLERS[kind] = (handler, atomic)
+        return handler
+
+    return decorator
+
+
+def enqueue(kind, payload=None, key=None, max_attempts=5):
+    # Ставит задачу в очередь. Повторная постановка с тем же idempotency key вернет уже существующую задачу
+    defaults = {'kind': kind, 'payload': payload or {}, 'max_attempts': max_attempts}
+    if key:
+        job, created = Job.objects.get_or_create(idempotency_key=key, defaults=defaults)
+    else:
+        job, created = Job.objects.create(**defaults), True
+
+    if created and settings.JOBS_RUN_EAGERLY:
+        # Без воркера (локальная разработка) выполняем задачу сразу после коммита текущей транзакции
+        transaction.on_commit(lambda: execute(claim_job(job)))
+
+    return job
+
+
+def claim_job(job):
+    Job.objects.filter(pk=job.pk).update(status='running', attempts=F('attempts') + 1,
+                                         locked_until=timezone.now() + LOCK_TIMEOUT)
+    job.refresh_from_db()
+    return job
+
+
+def claim(limit=10):
+    # Забирает готовые к выполнению задачи. skip_locked позволяет нескольким воркерам не мешать друг другу
+    now = timezone.now()
+    ready = Q(status='pending', run_after__lte=now) | Q(status='running', locked_until__lt=now)
+
+    with transaction.atomic():
+        ids = list(Job.objects.select_for_update(skip_locked=True).filter(ready)
+                   .order_by('run_after', 'id').values_list('id', flat=True)[:limit])
+        Job.objects.filter(pk__in=ids).update(status='running', attempts=F('attempts') + 1,
+                                              locked_until=now + LOCK_TIMEOUT)
+
+    return list(Job.objects.filter(pk__in=ids).order_by('run_after', 'id'))
+
+
+def execute(job):
+    handler, atomic = HANDLERS.get(job.kind, (None, True))
+
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {job.kind!r}')
+
+        with transaction.atomic() if atomic else nullcontext():
+            handler(job)
+            if atomic:
+                finish(job)
+    except Exception:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        failed = job.attempts >= job.max_attempts
+        delay = min(2 ** job.attempts, MAX_RETRY_DELAY)
+        Job.objects.filter(pk=job.pk).update(status='failed' if failed else 'pending', locked_until=None,
+                                             run_after=timezone.now() + timedelta(seconds=delay),
+                                             last_error=traceback.format_exc(), updated_at=timezone.now())
+        return False
+
+    if not atomic:
+        finish(job)
+    return True
+
+
+def finish(job):
+    # Задачу без idempotency key больше никто не ищет - удаляем ее сразу. Задачи с ключом остаются со статусом done,
+    # чтобы повторная постановка с тем же ключом не выполнила их снова (их удаляет purge)
+    if job.idempotency_key:
+        Job.objects.filter(pk=job.pk).update(status='done', locked_until=None, updated_at=timezone.now())
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+
+
+def purge(older_than):
+    # Удаляет выполненные и окончательно упавшие задачи, которые не менялись дольше older_than
+    deleted, _ = Job.objects.filter(status__in=('done', 'failed'), updated_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def checkpoint(job, **payload):
+    # Сохраняет прогресс долгой задачи, чтобы после сбоя она продолжилась с того же места
+    job.payload.update(payload)
+    Job.objects.filter(pk=job.pk).update(payload=job.payload, locked_until=timezone.now() + LOCK_TIMEOUT,
+                                         updated_at=timezone.now())
+
+
+def queue_depth():
+    # Метрика очереди: количество задач по статусам и видам и возраст самой старой ожидающей задачи
+    counts = (Job.objects.exclude(status='done').order_by().values('kind', 'status')
+              .annotate(count=Count('id')))
+    oldest = Job.objects.filter(status='pending').aggregate(oldest=Min('created_at'))['oldest']
+
+    depth = {}
+    for row in counts:
+        depth.setdefault(row['kind'], {})[row['status']] = row['count']
+
+    return {'pending': sum(kind.get('pending', 0) for kind in depth.values()),
+            'oldest_pending_seconds': int((timezone.now() - oldest).total_seconds()) if oldest else None,
+            'by_kind': depth}
@@ -0,0 +1,74 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+
+from .models import UserStats
+
+# Таблицы лидеров строятся по счетчикам UserStats, которые обновляются при завершении забега,
+# поэтому ни ранжирование, ни "мое место" не агрегируют забеги
+BOARDS = {
+    'distance': 'total_distance',
+    'longest_run': 'max_distance',
+    'speed': 'avg_speed',
+}
+
+
+def athletes_queryset(coach_id=None):
+    # Атлеты глобально или среди атлетов тренера
+    qs = UserStats.objects.filter(is_athlete=True)
+    if coach_id:
+        qs = qs.filter(user__subscriptions__coach_id=coach_id)
+    return qs
+
+
+def board_queryset(coach_id=None):
+    # Атлеты с хотя бы одним завершенным забегом
+    return athletes_queryset(coach_id).filter(runs_finished__gt=0)
+
+
+def rank_of(field, score, coach_id=None):
+    # Место = 1 + количество атлетов со строго большим значением. Значения счетчиков неотрицательны,
+    # поэтому field > score уже означает завершенный забег и runs_finished не проверяем. Глобально это
+    # диапазонный проход только по индексу (is_athlete, -field, user) без соединений: O(log n + место).
+    # Для таблицы тренера подсчет идет по подпискам тренера: O(число его атлетов)
+    return athletes_queryset(coach_id).filter(**{f'{field}__gt': score}).count() + 1
+
+
+def rank_rows(field, rows, coach_id=None):
+    # Места для упорядоченной по убыванию страницы: одним запросом считаем место первой строки,
+    # у остальных место определяется позицией первой строки с тем же значением
+    if not rows:
+        return []
+
+    first_rank = rank_of(field, getattr(rows[0], field), coach_id)
+    ranked = []
+    for index, stats in enumerate(rows):
+        score = getattr(stats, field)
+        rank = ranked[-1]['rank'] if ranked and score == ranked[-1]['score'] else first_rank + index
+        ranked.append({'rank': rank, 'athlete': stats.user_id, 'username': stats.user.username,
+                       'first_name': stats.user.first_name, 'last_name': stats.user.last_name, 'score': score})
+    return ranked
+
+
+def my_rank(field, athlete_id, coach_id=None):
+    stats = board_queryset(coach_id).filter(user_id=athlete_id).only('user_id', field).first()
+    if stats is None:
+        return None
+
+    score = getattr(stats, field)
+    return {'athlete': stats.user_id, 'rank': rank_of(field, score, coach_id), 'score': score}
+
+
+def is_athlete(user):
+    return not user.is_staff and not user.is_superuser
+
+
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Держим UserStats.is_athlete в согласии с флагами пользователя. Сохранения других полей
+    # (например, last_login при входе) пропускаем
+    if created or (update_fields is not None and not {'is_staff', 'is_superuser'} & set(update_fields)):
+        return
+    UserStats.objects.filter(user_id=instance.pk).exclude(is_athlete=is_athlete(instance)) \
+        .update(is_athlete=is_athlete(instance))
+
+
+post_save.connect(user_saved, sender=User, dispatch_uid='leaderboards:user_saved')
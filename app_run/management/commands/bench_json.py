@@ -0,0 +1,108 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from app_run.middleware import brotli
+from app_run.models import Run, Position
+from app_run.renderers import FastJSONRenderer, orjson
+from app_run.serializers import PositionSerializer
+from app_run.views import PositionViewSet
+
+BENCH_COMMENT = 'bench_json'
+
+RENDERERS = {
+    'json': JSONRenderer,
+    'orjson': FastJSONRenderer,
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет процессорное время и объем ответа /api/positions/?run= для длинного забега '
+            'со стандартным JSON и orjson, без сжатия, с gzip и brotli. Запускать только на локальной базе!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=20000, help='Количество точек в забеге')
+        parser.add_argument('--size', type=int, default=1000, help='Размер страницы')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовые данные после замера')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, FastJSONRenderer falls back to json'))
+
+        run = self.seed(options['points'])
+        try:
+            self.measure_render(run)
+            self.measure_requests(run, options['size'])
+        finally:
+            if not options['keep']:
+                Run.objects.filter(comment=BENCH_COMMENT).delete()
+                User.objects.filter(username=BENCH_COMMENT).delete()
+
+    def seed(self, points):
+        athlete, _ = User.objects.get_or_create(username=BENCH_COMMENT)
+        run = Run.objects.create(athlete=athlete, comment=BENCH_COMMENT, status='in_progress')
+        start = timezone.now() - timedelta(days=1)
+        Position.objects.bulk_create((Position(run=run, latitude=55.75 + number % 1000 / 100000,
+                                               longitude=37.61 + number % 700 / 100000,
+                                               date_time=start + timedelta(seconds=number),
+                                               speed=round(2 + number % 50 / 10, 2), distance=round(number / 300, 2))
+                                      for number in range(points)), batch_size=5000)
+
+        self.stdout.write(f'Seeded a run with {points} positions')
+        return run
+
+    def measure_render(self, run):
+        # Только рендеринг уже сериализованного трека целиком
+        data = PositionSerializer(Position.objects.filter(run=run).order_by('date_time', 'id'), many=True).data
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Render {len(data)} positions'))
+
+        outputs = {}
+        for name, renderer_class in RENDERERS.items():
+            started = time.process_time()
+            outputs[name] = renderer_class().render(data)
+            self.stdout.write(f'{name:>7}: {(time.process_time() - started) * 1000:.1f} ms CPU, '
+                              f'{len(outputs[name])} bytes')
+        self.stdout.write(f'identical output: {outputs["json"] == outputs["orjson"]}')
+
+    def measure_requests(self, run, size):
+        # Полная выгрузка трека постранично через API: процессорное время на запросы и байты в ответах
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+        self.stdout.write(self.style.MIGRATE_HEADING(f'GET /api/positions/?run={run.id}&size={size}, all pages'))
+
+        renderer_classes = PositionViewSet.renderer_classes
+        try:
+            for name, renderer_class in RENDERERS.items():
+                PositionViewSet.renderer_classes = [renderer_class]
+                for encoding in encodings:
+                    client = Client(HTTP_ACCEPT_ENCODING=encoding)
+                    url = f'/api/positions/?run={run.id}&size={size}'
+                    pages = wire_bytes = cpu = 0
+
+                    while url:
+                        started = time.process_time()
+                        response = client.get(url)
+                        cpu += time.process_time() - started
+
+                        wire_bytes += len(response.content)
+                        pages += 1
+                        url = json.loads(self.decompress(response))['next']
+
+                    self.stdout.write(f'{name:>7} {encoding:>8}: {pages} pages, {cpu * 1000:.1f} ms CPU, '
+                                      f'{wire_bytes} bytes')
+        finally:
+            PositionViewSet.renderer_classes = renderer_classes
+
+    def decompress(self, response):
+        encoding = response.get('Content-Encoding')
+        if encoding == 'gzip':
+            return gzip.decompress(response.content)
+        if encoding == 'br':
+            return brotli.decompress(response.content)
+        return response.content
@@ -0,0 +1,96 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from app_run.models import Run, Position
+
+BENCH_COMMENT = 'bench_position_index'
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу тестовыми точками и сравнивает планы и время частых запросов к Position '
+            'с составным индексом (run, date_time) и без него. Запускать только на локальной базе!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=1000, help='Количество тестовых забегов')
+        parser.add_argument('--points', type=int, default=2000, help='Количество точек в каждом забеге')
+        parser.add_argument('--repeat', type=int, default=200, help='Сколько раз выполнять каждый запрос')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовые данные после замера')
+
+    def handle(self, *args, **options):
+        runs = self.seed(options['runs'], options['points'])
+
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING('With (run, date_time) index'))
+            self.measure(runs, options['repeat'])
+
+            index = Position._meta.indexes[0]
+            with connection.schema_editor() as schema_editor:
+                schema_editor.remove_index(Position, index)
+            try:
+                self.stdout.write(self.style.MIGRATE_HEADING('Without (run, date_time) index'))
+                self.measure(runs, options['repeat'])
+            finally:
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.add_index(Position, index)
+        finally:
+            if not options['keep']:
+                Run.objects.filter(comment=BENCH_COMMENT).delete()
+
+    def seed(self, runs_count, points_count):
+        athlete, _ = User.objects.get_or_create(username=BENCH_COMMENT)
+        runs = Run.objects.bulk_create(Run(athlete=athlete, comment=BENCH_COMMENT, status='in_progress')
+                                       for _ in range(runs_count))
+        start = timezone.now() - timedelta(days=1)
+
+        if connection.vendor == 'postgresql':
+            # На PostgreSQL генерируем миллионы строк одним INSERT ... SELECT
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {Position._meta.db_table} (run_id, latitude, longitude, date_time, speed, distance) '
+                    'SELECT r.id, 55.75 + random() * 0.01, 37.61 + random() * 0.01, '
+                    "%s + g * interval '1 second', 0, 0 "
+                    f'FROM {Run._meta.db_table} r CROSS JOIN generate_series(1, %s) g WHERE r.comment = %s',
+                    [start, points_count, BENCH_COMMENT])
+                cursor.execute(f'ANALYZE {Position._meta.db_table}')
+        else:
+            for run in runs:
+                Position.objects.bulk_create(
+                    (Position(run=run, latitude=55.75 + random.random() * 0.01,
+                              longitude=37.61 + random.random() * 0.01,
+                              date_time=start + timedelta(seconds=second))
+                     for second in range(points_count)),
+                    batch_size=5000)
+
+        self.stdout.write(f'Seeded {runs_count} runs x {points_count} positions')
+        return runs
+
+    def measure(self, runs, repeat):
+        def middle_time():
+            return timezone.now() - timedelta(days=1) + timedelta(seconds=random.randint(1, 1000))
+
+        queries = {
+            # Поиск предыдущей точки при загрузке (track.stored_track_from)
+            'previous point': lambda run: Position.objects.filter(run=run, date_time__lt=middle_time())
+                                                          .order_by('-date_time')[:1],
+            # Первые точки трека по времени
+            'ordered track': lambda run: Position.objects.filter(run=run).order_by('date_time', 'id')[:100],
+            # Фильтр ?run= в PositionViewSet
+            'run filter': lambda run: Position.objects.filter(run_id=run.id)[:100],
+        }
+        explain_options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+
+        for name, build in queries.items():
+            self.stdout.write(self.style.SQL_KEYWORD(name))
+            self.stdout.write(build(runs[0]).explain(**explain_options))
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(build(random.choice(runs)))
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f'{name}: {elapsed:.3f} ms per query\n')
@@ -0,0 +1,88 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from app_run.models import Run, Position
+from app_run.views import RunViewSet, UserViewSet, PositionViewSet
+
+BENCH_COMMENT = 'bench_serializers'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает обычные сериализаторы DRF и быструю сериализацию из values() на списках забегов, '
+            'пользователей и точек и проверяет, что JSON совпадает байт в байт. Запускать только на локальной базе!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Размеры страниц')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз сериализовать каждую страницу')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовые данные после замера')
+
+    def handle(self, *args, **options):
+        count = max(options['sizes'])
+        run = self.seed(count)
+
+        try:
+            for name, viewset, url in (('runs', RunViewSet, '/api/runs/'),
+                                       ('users', UserViewSet, '/api/users/'),
+                                       ('positions', PositionViewSet, f'/api/positions/?run={run.id}')):
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                queryset = self.list_queryset(viewset, url)
+                for size in options['sizes']:
+                    self.measure(viewset.values_serializer, queryset, size, options['repeat'])
+        finally:
+            if not options['keep']:
+                Run.objects.filter(comment=BENCH_COMMENT).delete()
+                User.objects.filter(username__startswith=BENCH_COMMENT).delete()
+
+    def seed(self, count):
+        athletes = User.objects.bulk_create(User(username=f'{BENCH_COMMENT}_{number}', first_name='Bench',
+                                                 last_name=str(number), is_staff=number % 10 == 0)
+                                            for number in range(count))
+        Run.objects.bulk_create((Run(athlete=athletes[number % len(athletes)], comment=BENCH_COMMENT,
+                                     status='finished', distance=number / 100, run_time_seconds=number, speed=3.5)
+                                 for number in range(count)), batch_size=5000)
+
+        run = Run.objects.create(athlete=athletes[0], comment=BENCH_COMMENT, status='in_progress')
+        start = timezone.now() - timedelta(days=1)
+        Position.objects.bulk_create((Position(run=run, latitude=55.75 + number % 100 / 10000,
+                                               longitude=37.61 + number % 100 / 10000,
+                                               date_time=start + timedelta(seconds=number),
+                                               speed=2.5, distance=number / 1000)
+                                      for number in range(count)), batch_size=5000)
+
+        self.stdout.write(f'Seeded {count} users, {count} runs and {count} positions')
+        return run
+
+    def list_queryset(self, viewset, url):
+        # Тот же queryset, что строит list, но без пагинации
+        view = viewset(action_map={'get': 'list'}, format_kwarg=None)
+        view.request = view.initialize_request(APIRequestFactory().get(url))
+        return view.filter_queryset(view.get_queryset()).order_by('id')
+
+    def measure(self, values_serializer, queryset, size, repeat):
+        renderer = JSONRenderer()
+        serializer_class = values_serializer.serializer_class
+
+        def drf():
+            return renderer.render(serializer_class(list(queryset[:size]), many=True).data)
+
+        def fast():
+            return renderer.render(values_serializer.serialize(values_serializer.values(queryset)[:size]))
+
+        if drf() != fast():
+            raise CommandError(f'{serializer_class.__name__}: fast output differs for page size {size}')
+
+        timings = {}
+        for name, render in (('drf', drf), ('fast', fast)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                render()
+            timings[name] = (time.perf_counter() - started) / repeat * 1000
+
+        self.stdout.write(f'{size:>6}: drf {timings["drf"]:.1f} ms, fast {timings["fast"]:.1f} ms, '
+                          f'x{timings["drf"] / timings["fast"]:.1f}, output identical')
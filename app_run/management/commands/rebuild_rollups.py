@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_run.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные и недельные итоги тренировок по завершенным забегам'
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS('Training rollups rebuilt'))
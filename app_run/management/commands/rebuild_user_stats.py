@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app_run.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу UserStats с нуля по забегам и подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить согласованность UserStats, ничего не записывая')
+
+    def handle(self, *args, **options):
+        mismatched = rebuild_user_stats(dry_run=options['check'])
+
+        if mismatched:
+            self.stdout.write(self.style.WARNING(f'{len(mismatched)} users had stale stats: '
+                                                 f'{", ".join(map(str, mismatched))}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('UserStats is consistent'))
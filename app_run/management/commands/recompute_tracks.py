@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_run.models import Run
+from app_run.track import recompute_track
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает накопленную дистанцию и скорость точек для указанных забегов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('run_ids', nargs='*', type=int, help='Id забегов для пересчета')
+        parser.add_argument('--all', action='store_true', help='Пересчитать все забеги')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            runs = Run.objects.all()
+        elif options['run_ids']:
+            runs = Run.objects.filter(id__in=options['run_ids'])
+        else:
+            raise CommandError('Укажите id забегов или --all')
+
+        for run in runs.order_by('id').iterator():
+            positions = recompute_track(run)
+            self.stdout.write(f'Run {run.id}: {len(positions)} positions recomputed')
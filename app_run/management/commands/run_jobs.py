@@ -0,0 +1,56 @@
+import json
+import time
+from datetime import timedelta
+from multiprocessing import Process
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app_run.jobs import claim, execute, purge, queue_depth
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры фоновой очереди задач (задачи хранятся в основной базе)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Количество процессов-воркеров')
+        parser.add_argument('--batch', type=int, default=10, help='Сколько задач забирать за раз')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Пауза в секундах, если очередь пуста')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти (для запуска по расписанию)')
+        parser.add_argument('--stats', action='store_true', help='Показать глубину очереди и выйти')
+        parser.add_argument('--purge-older-than', type=float, metavar='DAYS',
+                            help='Перед запуском удалить выполненные и упавшие задачи старше DAYS дней')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_depth(), indent=2))
+            return
+
+        if options['purge_older_than'] is not None:
+            deleted = purge(timedelta(days=options['purge_older_than']))
+            self.stdout.write(f'Purged {deleted} finished jobs')
+
+        if options['processes'] == 1:
+            self.work(options['batch'], options['sleep'], options['once'])
+            return
+
+        connections.close_all()  # Дочерние процессы должны открыть собственные соединения с базой
+        workers = [Process(target=self.work, args=(options['batch'], options['sleep'], options['once']))
+                   for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def work(self, batch, sleep, once):
+        while True:
+            jobs = claim(batch)
+            for job in jobs:
+                ok = execute(job)
+                self.stdout.write(f'Job {job.id} ({job.kind}): {"done" if ok else "failed"}')
+
+            if not jobs:
+                if once:
+                    return
+                time.sleep(sleep)
@@ -0,0 +1,42 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    # GZipMiddleware с порогом COMPRESSION_MIN_SIZE байт и brotli. Маленькие ответы не сжимаем - выигрыш в байтах
+    # меньше затрат процессора. gzip со случайными байтами в заголовке (защита от BREACH) остается за GZipMiddleware.
+    # brotli такой защиты не дает, поэтому им сжимаем только ответы API, а HTML (browsable API с CSRF токеном) -
+    # только через gzip
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        if brotli is None or response.streaming or response.has_header('Content-Encoding') \
+                or response.get('Content-Type', '').startswith('text/html') \
+                or not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = 'br'
+        # Сжатый ответ уже не совпадает байт в байт с несжатым, поэтому ETag становится слабым
+        if response.get('ETag', '').startswith('"'):
+            response.headers['ETag'] = f'W/{response.headers["ETag"]}'
+
+        return response
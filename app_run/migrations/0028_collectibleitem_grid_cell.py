@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+from app_run.geo import grid_cell
+
+
+def fill_grid_cells(apps, schema_editor):
+    CollectibleItem = apps.get_model('app_run', 'CollectibleItem')
+    items = list(CollectibleItem.objects.all())
+    for item in items:
+        item.lat_cell, item.lon_cell = grid_cell(item.latitude, item.longitude)
+    CollectibleItem.objects.bulk_update(items, ['lat_cell', 'lon_cell'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0027_rename_subscribe_subscription'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectibleitem',
+            name='lat_cell',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='collectibleitem',
+            name='lon_cell',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='collectibleitem',
+            index=models.Index(fields=['lat_cell', 'lon_cell'], name='app_run_col_lat_cel_a4fc97_idx'),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
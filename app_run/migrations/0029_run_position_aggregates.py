@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-17 03:57
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_run_aggregates(apps, schema_editor):
+    Run = apps.get_model('app_run', 'Run')
+    Position = apps.get_model('app_run', 'Position')
+
+    positions = Position.objects.filter(run=OuterRef('pk')).order_by().values('run')
+    Run.objects.update(
+        positions_count=Coalesce(Subquery(positions.annotate(value=Count('id')).values('value')), Value(0)),
+        first_position_at=Subquery(positions.annotate(value=Min('date_time')).values('value')),
+        last_position_at=Subquery(positions.annotate(value=Max('date_time')).values('value')),
+        speed_sum=Coalesce(Subquery(positions.annotate(value=Sum('speed')).values('value')), Value(0.0)),
+        last_distance=Coalesce(Subquery(Position.objects.filter(run=OuterRef('pk'))
+                                        .order_by('-date_time', '-id').values('distance')[:1]), Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0028_collectibleitem_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='first_position_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='last_distance',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='last_position_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='positions_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='speed_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(fill_run_aggregates, migrations.RunPython.noop),
+    ]
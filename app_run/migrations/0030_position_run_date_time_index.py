@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0029_run_position_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='position',
+            index=models.Index(fields=['run', 'date_time'], name='app_run_pos_run_id_c8a227_idx'),
+        ),
+    ]
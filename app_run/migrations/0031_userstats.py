@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 03:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_user_stats(apps, schema_editor):
+    Run = apps.get_model('app_run', 'Run')
+    UserStats = apps.get_model('app_run', 'UserStats')
+
+    totals = (Run.objects.filter(status='finished').order_by().values('athlete')
+              .annotate(runs_finished=Count('id'), total_distance=Sum('distance')))
+    UserStats.objects.bulk_create([UserStats(user_id=row['athlete'], runs_finished=row['runs_finished'],
+                                             total_distance=row['total_distance'] or 0.0) for row in totals],
+                                  batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0030_position_run_date_time_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('runs_finished', models.IntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0.0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 03:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0031_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=100)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='app_run_job_status_3396a7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 04:00
+
+from django.db import migrations, models
+from django.db.models import Avg, Sum
+
+
+def fill_rating_and_run_time(apps, schema_editor):
+    Run = apps.get_model('app_run', 'Run')
+    Subscription = apps.get_model('app_run', 'Subscription')
+    UserStats = apps.get_model('app_run', 'UserStats')
+
+    run_times = (Run.objects.filter(status='finished').order_by().values('athlete')
+                 .annotate(total=Sum('run_time_seconds')))
+    for row in run_times:
+        UserStats.objects.update_or_create(user_id=row['athlete'], defaults={'total_run_time': row['total'] or 0})
+
+    ratings = Subscription.objects.order_by().values('coach').annotate(rating=Avg('rating'))
+    for row in ratings:
+        UserStats.objects.update_or_create(user_id=row['coach'], defaults={'rating': row['rating']})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0032_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='total_run_time',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_and_run_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 04:03
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0033_userstats_rating_run_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('file', models.BinaryField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_inserted', models.IntegerField(default=0)),
+                ('invalid_rows_count', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportInvalidRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invalid_rows', to='app_run.importjob')),
+            ],
+        ),
+    ]
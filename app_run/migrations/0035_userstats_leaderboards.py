@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-17 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def fill_leaderboard_fields(apps, schema_editor):
+    Run = apps.get_model('app_run', 'Run')
+    UserStats = apps.get_model('app_run', 'UserStats')
+
+    totals = (Run.objects.filter(status='finished').order_by().values('athlete')
+              .annotate(count=Count('id'), max_distance=Max('distance'), speed_sum=Sum('speed')))
+    for row in totals:
+        speed_sum = row['speed_sum'] or 0.0
+        UserStats.objects.update_or_create(user_id=row['athlete'], defaults={
+            'max_distance': row['max_distance'] or 0.0,
+            'speed_sum': speed_sum,
+            'avg_speed': speed_sum / row['count'],
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0034_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='avg_speed',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='max_distance',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='speed_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-total_distance', 'user'], name='app_run_use_total_d_e25faa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-max_distance', 'user'], name='app_run_use_max_dis_2c260c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-avg_speed', 'user'], name='app_run_use_avg_spe_7de49f_idx'),
+        ),
+        migrations.RunPython(fill_leaderboard_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-17 04:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+
+
+def fill_rollups(apps, schema_editor):
+    Run = apps.get_model('app_run', 'Run')
+
+    for model_name, trunc in (('DailyRollup', TruncDate('created_at')),
+                              ('WeeklyRollup', TruncWeek('created_at', output_field=models.DateField()))):
+        model = apps.get_model('app_run', model_name)
+        rows = (Run.objects.filter(status='finished').order_by().annotate(period_start=trunc)
+                .values('athlete', 'period_start')
+                .annotate(runs=Count('id'), distance=Sum('distance'), run_time_seconds=Sum('run_time_seconds'),
+                          max_speed=Max('speed')))
+        model.objects.bulk_create([model(athlete_id=row['athlete'], period=row['period_start'], runs=row['runs'],
+                                         distance=row['distance'] or 0.0,
+                                         run_time_seconds=row['run_time_seconds'] or 0,
+                                         max_speed=row['max_speed'] or 0.0) for row in rows],
+                                  batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0035_userstats_leaderboards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('runs', models.IntegerField(default=0)),
+                ('distance', models.FloatField(default=0.0)),
+                ('run_time_seconds', models.IntegerField(default=0)),
+                ('max_speed', models.FloatField(default=0.0)),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('athlete', 'period')},
+            },
+        ),
+        migrations.CreateModel(
+            name='WeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('runs', models.IntegerField(default=0)),
+                ('distance', models.FloatField(default=0.0)),
+                ('run_time_seconds', models.IntegerField(default=0)),
+                ('max_speed', models.FloatField(default=0.0)),
+                ('athlete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('athlete', 'period')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0036_training_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='run',
+            name='positions_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='run',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 04:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0037_run_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userstats',
+            name='total_run_time',
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 04:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_is_athlete(apps, schema_editor):
+    UserStats = apps.get_model('app_run', 'UserStats')
+    UserStats.objects.filter(user__is_staff=False, user__is_superuser=False).update(is_athlete=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_run', '0038_remove_userstats_total_run_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userstats',
+            name='app_run_use_total_d_e25faa_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userstats',
+            name='app_run_use_max_dis_2c260c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userstats',
+            name='app_run_use_avg_spe_7de49f_idx',
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='is_athlete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_is_athlete, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['is_athlete', '-total_distance', 'user'], name='app_run_use_is_athl_4a4a2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['is_athlete', '-max_distance', 'user'], name='app_run_use_is_athl_ba5b3f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['is_athlete', '-avg_speed', 'user'], name='app_run_use_is_athl_ce3870_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .geo import grid_cell
 
 
 class Run(models.Model):
@@ -17,6 +21,18 @@ class Run(models.Model):
     run_time_seconds = models.IntegerField(null=True, blank=True)
     speed = models.FloatField(default=0.0)
 
+    # Агрегаты по точкам забега, обновляются при каждой загрузке точек (см. track.create_positions)
+    positions_count = models.IntegerField(default=0)
+    first_position_at = models.DateTimeField(null=True, blank=True)
+    last_position_at = models.DateTimeField(null=True, blank=True)
+    last_distance = models.FloatField(default=0.0)
+    speed_sum = models.FloatField(default=0.0)
+
+    # Версии для условных GET (ETag / Last-Modified). updated_at меняется при любом изменении забега или его точек,
+    # positions_version - только при изменении точек. Массовые update() обновляют их явно (см. track.py)
+    updated_at = models.DateTimeField(auto_now=True)
+    positions_version = models.PositiveIntegerField(default=0)
+
 
 class AthleteInfo(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -37,6 +53,10 @@ class Position(models.Model):
     speed = models.FloatField(default=0.0)
     distance = models.FloatField(default=0.0)
 
+    class Meta:
+        # Все частые запросы к точкам фильтруют по забегу и сортируют по времени
+        indexes = [models.Index(fields=['run', 'date_time'])]
+
 
 class CollectibleItem(models.Model):
     name = models.CharField(max_length=255)
@@ -46,6 +66,16 @@ class CollectibleItem(models.Model):
     picture = models.URLField()
     value = models.IntegerField()
     collected_by = models.ManyToManyField(User, related_name='collected_items', blank=True)
+    # Ячейка сетки пространственного индекса, пересчитывается при каждом сохранении
+    lat_cell = models.IntegerField(null=True, blank=True)
+    lon_cell = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['lat_cell', 'lon_cell'])]
+
+    def save(self, *args, **kwargs):
+        self.lat_cell, self.lon_cell = grid_cell(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
 
 
 class Subscription(models.Model):
@@ -55,3 +85,92 @@ class Subscription(models.Model):
 
     class Meta:
         unique_together = ('athlete', 'coach')  # Эта конструкция запрещает дублирование подписок на уровне базы данных
+
+
+class UserStats(models.Model):
+    # Счетчики по пользователю, которые обновляются инкрементально при завершении забега (см. challenges.py)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
+    runs_finished = models.IntegerField(default=0)
+    total_distance = models.FloatField(default=0.0)
+    max_distance = models.FloatField(default=0.0)
+    speed_sum = models.FloatField(default=0.0)
+    avg_speed = models.FloatField(default=0.0)
+    rating = models.FloatField(null=True, blank=True)  # Средний рейтинг тренера, обновляется при оценке тренера
+    # Не тренер и не администратор. Копия флагов User, чтобы таблицы лидеров не соединялись с auth_user
+    is_athlete = models.BooleanField(default=False)
+
+    class Meta:
+        # Индексы для таблиц лидеров (см. leaderboards.py)
+        indexes = [models.Index(fields=['is_athlete', '-total_distance', 'user']),
+                   models.Index(fields=['is_athlete', '-max_distance', 'user']),
+                   models.Index(fields=['is_athlete', '-avg_speed', 'user'])]
+
+
+class Job(models.Model):
+    # Задача фоновой очереди, хранится в основной базе (см. jobs.py)
+    status_choices = [('pending', 'Pending'),
+                      ('running', 'Running'),
+                      ('done', 'Done'),
+                      ('failed', 'Failed')
+                      ]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=status_choices, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)  # Если воркер упал, задачу заберет другой
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+class ImportJob(models.Model):
+    # Фоновый импорт CollectibleItem из xlsx файла (см. imports.py)
+    status_choices = [('pending', 'Pending'),
+                      ('running', 'Running'),
+                      ('done', 'Done'),
+                      ('failed', 'Failed')
+                      ]
+
+    file_name = models.CharField(max_length=255)
+    file = models.BinaryField()  # Файл храним в базе, чтобы воркеру не нужно было общее файловое хранилище
+    status = models.CharField(max_length=20, choices=status_choices, default='pending')
+    rows_processed = models.IntegerField(default=0)
+    rows_inserted = models.IntegerField(default=0)
+    invalid_rows_count = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class ImportInvalidRow(models.Model):
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='invalid_rows')
+    row = models.JSONField(encoder=DjangoJSONEncoder)
+
+
+class TrainingRollup(models.Model):
+    # Итоги тренировок атлета за период, обновляются при завершении забега (см. rollups.py)
+    athlete = models.ForeignKey(User, on_delete=models.CASCADE)
+    period = models.DateField()
+    runs = models.IntegerField(default=0)
+    distance = models.FloatField(default=0.0)
+    run_time_seconds = models.IntegerField(default=0)
+    max_speed = models.FloatField(default=0.0)
+
+    class Meta:
+        abstract = True
+        unique_together = ('athlete', 'period')
+
+
+class DailyRollup(TrainingRollup):
+    pass  # period - день забега
+
+
+class WeeklyRollup(TrainingRollup):
+    pass  # period - понедельник ISO недели забега
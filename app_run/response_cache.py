@@ -0,0 +1,123 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import User, Run, Position, Challenge, CollectibleItem, Subscription, UserStats
+
+# Страховка на случай пропущенной инвалидации, в секундах. Общая для всех кешей приложения с инвалидацией
+CACHE_TIMEOUT = 60 * 60
+
+# Модели, от которых зависят кешированные ответы. Любое изменение строки такой модели увеличивает ее версию,
+# а версии входят в ключ кеша, поэтому старые ответы просто перестают находиться.
+# Position к сигналам не подключена: любой обработчик сигнала на Position отключает быстрое каскадное удаление,
+# и удаление забега загружало бы и обрабатывало каждую его точку. Версию Position увеличивают явно:
+# загрузка и пересчет трека (track.py), удаление точки и удаление забега (run_deleted)
+VERSIONED_MODELS = (User, Run, Challenge, CollectibleItem, Subscription, UserStats)
+
+CACHED_VIEWS = set()  # Имена представлений с кешем ответов, для статистики попаданий
+
+
+def version_key(model):
+    return f'response_cache:version:{model._meta.label_lower}'
+
+
+def model_versions(models):
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Версия могла быть вытеснена из кеша: начинаем с текущего времени, а не с 1,
+            # чтобы не совпасть с версией, под которой уже лежат старые ответы
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_model_versions(*models):
+    # Массовые операции (bulk_create, bulk_update, update) не посылают сигналы - для них версию увеличиваем явно.
+    # Увеличиваем после коммита, иначе параллельный запрос успеет закешировать старые данные под новой версией
+    def bump():
+        for model in models:
+            try:
+                cache.incr(version_key(model))
+            except ValueError:
+                cache.add(version_key(model), time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def model_changed(sender, **kwargs):
+    bump_model_versions(sender)
+
+
+def run_deleted(sender, **kwargs):
+    # Точки удаляются каскадом вместе с забегом, одним запросом и без сигналов
+    bump_model_versions(Run, Position)
+
+
+for versioned_model in VERSIONED_MODELS:
+    post_save.connect(model_changed, sender=versioned_model, dispatch_uid=f'response_cache:save:{versioned_model}')
+    post_delete.connect(run_deleted if versioned_model is Run else model_changed, sender=versioned_model,
+                        dispatch_uid=f'response_cache:delete:{versioned_model}')
+
+
+def count(view_name, outcome):
+    key = f'response_cache:stats:{view_name}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def cache_stats():
+    # Количество попаданий и промахов кеша по каждому представлению
+    keys = {(view_name, outcome): f'response_cache:stats:{view_name}:{outcome}'
+            for view_name in CACHED_VIEWS for outcome in ('hit', 'miss')}
+    values = cache.get_many(keys.values())
+
+    stats = {}
+    for (view_name, outcome), key in sorted(keys.items()):
+        stats.setdefault(view_name, {})[outcome] = values.get(key, 0)
+    return stats
+
+
+def cache_response(*models, timeout=CACHE_TIMEOUT):
+    # Кеширует данные успешного GET ответа представления DRF (метода APIView/ViewSet или функции с @api_view).
+    # Ключ: имя представления, версии моделей models и полный URL запроса (фильтры, пагинация, хост в ссылках)
+    def decorator(view):
+        view_name = view.__qualname__
+        CACHED_VIEWS.add(view_name)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = args[0] if isinstance(args[0], Request) else args[1]
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            versions = ':'.join(str(version) for version in model_versions(models))
+            url_key = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+            key = f'response_cache:{view_name}:{versions}:{url_key}'
+
+            data = cache.get(key)
+            if data is not None:
+                count(view_name, 'hit')
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            count(view_name, 'miss')
+            response = view(*args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
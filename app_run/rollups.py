@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Sum
+from django.db.models.functions import Greatest, TruncDate, TruncWeek
+from django.utils import timezone
+
+from .models import Run, DailyRollup, WeeklyRollup
+
+ROLLUPS = {
+    'day': (DailyRollup, TruncDate),
+    'week': (WeeklyRollup, lambda field: TruncWeek(field, output_field=DateField())),  # Понедельник ISO недели
+}
+
+
+def run_periods(run):
+    day = timezone.localtime(run.created_at).date()
+    return {'day': day, 'week': day - timedelta(days=day.weekday())}
+
+
+def add_run(run):
+    # Добавляем завершенный забег в дневной и недельный итоги атлета
+    periods = run_periods(run)
+
+    with transaction.atomic():
+        for name, (model, _) in ROLLUPS.items():
+            rollup, _ = model.objects.get_or_create(athlete_id=run.athlete_id, period=periods[name])
+            model.objects.filter(pk=rollup.pk).update(runs=F('runs') + 1,
+                                                      distance=F('distance') + (run.distance or 0.0),
+                                                      run_time_seconds=F('run_time_seconds') + (run.run_time_seconds or 0),
+                                                      max_speed=Greatest('max_speed', run.speed or 0.0))
+
+
+def rebuild_rollups():
+    # Полный пересчет итогов по завершенным забегам: один GROUP BY запрос на каждый вид итогов
+    with transaction.atomic():
+        for model, trunc in ROLLUPS.values():
+            model.objects.all().delete()
+            rows = (Run.objects.filter(status='finished').order_by()
+                    .annotate(period_start=trunc('created_at'))
+                    .values('athlete', 'period_start')
+                    .annotate(runs=Count('id'), distance=Sum('distance'), run_time_seconds=Sum('run_time_seconds'),
+                              max_speed=Max('speed')))
+            model.objects.bulk_create([model(athlete_id=row['athlete'], period=row['period_start'], runs=row['runs'],
+                                             distance=row['distance'] or 0.0,
+                                             run_time_seconds=row['run_time_seconds'] or 0,
+                                             max_speed=row['max_speed'] or 0.0) for row in rows],
+                                      batch_size=1000)
+
+
+def training_series(rollups, date_from, date_to):
+    # Временной ряд по итогам (один ряд на период), при нескольких атлетах значения суммируются
+    return list(rollups.filter(period__range=(date_from, date_to))
+                .values('period')
+                .annotate(runs=Sum('runs'), distance=Sum('distance'), run_time_seconds=Sum('run_time_seconds'),
+                          max_speed=Max('max_speed'))
+                .order_by('period'))
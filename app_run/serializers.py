@@ -1,6 +1,10 @@
 from dataclasses import field
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Run, User, AthleteInfo, Challenge, Position, CollectibleItem, Subscription
+from .models import Run, User, AthleteInfo, Challenge, Position, CollectibleItem, ImportJob
+from .columnar import COORDINATE_SCALE
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -52,20 +56,16 @@ class ChallengeSerializer(serializers.ModelSerializer):
         fields = ['athlete', 'full_name']
 
 
-class PositionSerializer(serializers.ModelSerializer):
+POSITIONS_BATCH_MAX_SIZE = 1000  # Максимальное количество точек в одном пакетном запросе
+
+
+class PositionPointSerializer(serializers.ModelSerializer):
     date_time = serializers.DateTimeField(format='%Y-%m-%dT%H:%M:%S.%f',
                                           input_formats=['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'])
 
     class Meta:
         model = Position
-        fields = ['id', 'run', 'latitude', 'longitude', 'date_time', 'speed', 'distance']
-        read_only_fields = ['speed', 'distance']
-
-    def validate_run(self, run):
-        if run.status != 'in_progress':
-            raise serializers.ValidationError('Run must be in progress!')
-
-        return run
+        fields = ['latitude', 'longitude', 'date_time']
 
     def validate_latitude(self, latitude):
         if not -90.0 <= latitude <= 90.0:
@@ -80,12 +80,69 @@ class PositionSerializer(serializers.ModelSerializer):
         return round(longitude, 4)
 
 
+class PositionSerializer(PositionPointSerializer):
+    class Meta:
+        model = Position
+        fields = ['id', 'run', 'latitude', 'longitude', 'date_time', 'speed', 'distance']
+        read_only_fields = ['speed', 'distance']
+
+    def validate_run(self, run):
+        if run.status != 'in_progress':
+            raise serializers.ValidationError('Run must be in progress!')
+
+        return run
+
+
+class PositionBatchSerializer(serializers.Serializer):
+    # Забег указывается один раз на всю пачку, поэтому он проверяется одним запросом, а не для каждой точки
+    run = serializers.PrimaryKeyRelatedField(queryset=Run.objects.all())
+    positions = PositionPointSerializer(many=True, allow_empty=False, max_length=POSITIONS_BATCH_MAX_SIZE)
+
+    def validate_run(self, run):
+        if run.status != 'in_progress':
+            raise serializers.ValidationError('Run must be in progress!')
+
+        return run
+
+
+class PackedPointsField(serializers.Field):
+    # Точки бинарного пакета (columnar.PackedPositionBatch). Диапазоны координат проверяем сразу по столбцам
+    # через min/max, а не валидаторами PositionPointSerializer для каждой точки
+    def to_internal_value(self, batch):
+        if not len(batch):
+            raise serializers.ValidationError('This list may not be empty.')
+        if len(batch) > POSITIONS_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(f'Ensure this field has no more than {POSITIONS_BATCH_MAX_SIZE} elements.')
+
+        errors = []
+        if min(batch.latitudes) < -90 * COORDINATE_SCALE or max(batch.latitudes) > 90 * COORDINATE_SCALE:
+            errors.append('Latitude must be between -90.0 and 90.0!')
+        if min(batch.longitudes) < -180 * COORDINATE_SCALE or max(batch.longitudes) > 180 * COORDINATE_SCALE:
+            errors.append('Longitude must be between -180.0 and 180.0!')
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        # Координаты уже целые с 4 знаками после запятой, округлять их не нужно
+        return [{'latitude': Decimal(latitude).scaleb(-4), 'longitude': Decimal(longitude).scaleb(-4),
+                 'date_time': batch.start + timedelta(milliseconds=offset)}
+                for latitude, longitude, offset in zip(batch.latitudes, batch.longitudes, batch.time_offsets)]
+
+
+class PackedPositionBatchSerializer(PositionBatchSerializer):
+    positions = PackedPointsField()
+
+
 class CollectibleItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CollectibleItem
         fields = ['id', 'name', 'uid', 'latitude', 'longitude', 'picture', 'value']
 
 
+class CollectibleItemImportSerializer(CollectibleItemSerializer):
+    # Уникальность uid при импорте проверяется пачкой строк в imports.py, а не отдельным запросом на каждую строку
+    uid = serializers.CharField(max_length=100)
+
+
 class UserDetailSerializer(UserSerializer):  # Наследуемся от Базового сериализатора
     items = CollectibleItemSerializer(source='collected_items', many=True)  # Новое поле
 
@@ -95,7 +152,7 @@ class UserDetailSerializer(UserSerializer):  # Наследуемся от Ба
 
 
 class AthleteDetailSerializer(UserSerializer):
-    items = CollectibleItemSerializer(read_only=True, many=True)
+    items = CollectibleItemSerializer(source='collected_items', read_only=True, many=True)
     coach = serializers.SerializerMethodField()
 
     class Meta:
@@ -103,8 +160,9 @@ class AthleteDetailSerializer(UserSerializer):
         fields = UserSerializer.Meta.fields + ['items', 'coach']
 
     def get_coach(self, obj):
-        subscription = obj.subscriptions.last()
-        return subscription.coach.id if subscription else None
+        # Подписки предзагружены в UserViewSet.retrieve в порядке id, берем последнюю без запроса к тренеру
+        subscriptions = obj.subscriptions.all()
+        return subscriptions[len(subscriptions) - 1].coach_id if subscriptions else None
 
 
 class CoachDetailSerializer(UserSerializer):
@@ -116,5 +174,11 @@ class CoachDetailSerializer(UserSerializer):
 
     def get_athletes(self, obj):
         # Используем заранее предзагруженный атрибут, чтобы не делать запросы
-        athletes = Subscription.objects.filter(coach=obj.id).values_list('athlete__id', flat=True)
-        return athletes
+        return [subscription.athlete_id for subscription in obj.subscribers.all()]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'file_name', 'status', 'rows_processed', 'rows_inserted', 'invalid_rows_count', 'error',
+                  'created_at', 'finished_at']
@@ -0,0 +1,102 @@
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q, Sum
+
+from .models import User, Run, Subscription, UserStats
+from .response_cache import CACHE_TIMEOUT, bump_model_versions
+
+
+def update_coach_rating(coach_id):
+    # Средний рейтинг тренера пересчитываем по его подпискам (индекс по coach), а не при каждом чтении списка
+    rating = Subscription.objects.filter(coach_id=coach_id).aggregate(rating=Avg('rating'))['rating']
+    UserStats.objects.update_or_create(user_id=coach_id, defaults={'rating': rating})
+
+
+def same(expected, actual):
+    # Суммы с плавающей точкой, накопленные инкрементально, могут отличаться в последних знаках
+    if isinstance(expected, float) and isinstance(actual, float):
+        return math.isclose(expected, actual, abs_tol=1e-6)
+    return expected == actual
+
+
+def rebuild_user_stats(dry_run=False):
+    # Полный пересчет UserStats по забегам и подпискам. Возвращает id пользователей, у которых значения разошлись.
+    # При dry_run=True только проверяет согласованность, ничего не записывая
+    users = User.objects.annotate(
+        stats_runs_finished=Count('run', filter=Q(run__status='finished')),
+        stats_total_distance=Sum('run__distance', filter=Q(run__status='finished')),
+        stats_max_distance=Max('run__distance', filter=Q(run__status='finished')),
+        stats_speed_sum=Sum('run__speed', filter=Q(run__status='finished')),
+    ).values('id', 'is_staff', 'is_superuser', 'stats_runs_finished', 'stats_total_distance', 'stats_max_distance',
+             'stats_speed_sum')
+    ratings = dict(Subscription.objects.order_by().values('coach').annotate(rating=Avg('rating'))
+                   .values_list('coach', 'rating'))
+    current = {stats.user_id: stats for stats in UserStats.objects.all()}
+
+    expected = [UserStats(user_id=row['id'],
+                          runs_finished=row['stats_runs_finished'],
+                          total_distance=row['stats_total_distance'] or 0.0,
+                          max_distance=row['stats_max_distance'] or 0.0,
+                          speed_sum=row['stats_speed_sum'] or 0.0,
+                          avg_speed=(row['stats_speed_sum'] or 0.0) / row['stats_runs_finished']
+                          if row['stats_runs_finished'] else 0.0,
+                          rating=ratings.get(row['id']),
+                          is_athlete=not row['is_staff'] and not row['is_superuser'])
+                for row in users]
+
+    fields = ['runs_finished', 'total_distance', 'max_distance', 'speed_sum', 'avg_speed', 'rating', 'is_athlete']
+    # Отсутствующая строка UserStats равносильна строке со значениями по умолчанию
+    mismatched = [stats.user_id for stats in expected
+                  if any(not same(getattr(stats, field), getattr(current.get(stats.user_id, UserStats()), field))
+                         for field in fields)]
+
+    if dry_run:
+        return mismatched
+
+    with transaction.atomic():
+        UserStats.objects.bulk_create(expected, batch_size=1000, update_conflicts=True,
+                                      unique_fields=['user'], update_fields=fields)
+        bump_model_versions(UserStats)
+
+    return mismatched
+
+
+def coach_analytics_key(coach_id):
+    return f'coach_analytics:{coach_id}'
+
+
+def coach_analytics(coach_id):
+    # Лидеры среди атлетов тренера по самому длинному забегу, суммарной дистанции и средней скорости.
+    # Агрегаты по каждому атлету считаются одним GROUP BY запросом и кешируются до завершения забега атлетом
+    key = coach_analytics_key(coach_id)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    athletes = list(Run.objects.filter(athlete__subscriptions__coach=coach_id)
+                    .values('athlete')
+                    .annotate(max_distance=Max('distance'), sum_distance=Sum('distance'), avg_speed=Avg('speed'))
+                    .order_by('athlete'))
+
+    def leader(field):
+        rows = [row for row in athletes if row[field] is not None]
+        if not rows:
+            return None, None
+        row = max(rows, key=lambda row: row[field])
+        return row['athlete'], row[field]
+
+    result = {}
+    for prefix, field in (('longest_run', 'max_distance'), ('total_run', 'sum_distance'), ('speed_avg', 'avg_speed')):
+        result[f'{prefix}_user'], result[f'{prefix}_value'] = leader(field)
+
+    cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def invalidate_coach_analytics(athlete_id=None, coach_id=None):
+    # Сбрасываем аналитику тренера или всех тренеров, на которых подписан атлет
+    coach_ids = [coach_id] if coach_id else \
+        Subscription.objects.filter(athlete_id=athlete_id).values_list('coach_id', flat=True)
+    cache.delete_many([coach_analytics_key(coach_id) for coach_id in coach_ids])
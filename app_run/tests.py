@@ -1,3 +1,680 @@
+import gzip
+import struct
+from io import BytesIO
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import openpyxl
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count, Max, Min, Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as django_timezone
+from rest_framework.test import APIClient
+
+from .challenges import COUNTERS, challenge, maintained_counters, process_finished_run
+from .columnar import (EPOCH, PACKED_HEADER, PACKED_VERSION, PACKED_BATCH_HEADER, PACKED_BATCH_MAGIC, PACKED_BATCH_RECORD,
+                       PACKED_BATCH_VERSION)
+from .imports import import_collectible_items_job
+from .jobs import LOCK_TIMEOUT, claim, execute, job, enqueue, purge
+from .leaderboards import rank_of
+from .models import (Run, Position, Challenge, UserStats, Job, Subscription, CollectibleItem, ImportJob, DailyRollup,
+                     WeeklyRollup)
+from .rollups import add_run, rebuild_rollups
+from .track import create_positions, recompute_track, stored_track_from
+
+START = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def make_points(run, minutes):
+    # Точки на одном меридиане: каждая следующая минута - на 0.001 градуса севернее
+    return [Position(run=run, latitude=Decimal('55.0000') + Decimal(minute) / 1000, longitude=Decimal('37.0000'),
+                     date_time=START + timedelta(minutes=minute)) for minute in minutes]
+
+
+def track_of(run):
+    return list(Position.objects.filter(run=run).order_by('date_time', 'id')
+                .values_list('date_time', 'speed', 'distance'))
+
+
+class OutOfOrderPositionsTest(TestCase):
+    def setUp(self):
+        self.athlete = User.objects.create(username='athlete')
+        self.run = Run.objects.create(athlete=self.athlete, comment='run', status='in_progress')
+
+    def test_points_from_the_past_recompute_track_suffix(self):
+        create_positions(self.run, make_points(self.run, [0, 1, 4, 5]))
+        create_positions(self.run, make_points(self.run, [2, 3]))  # Точки "из прошлого" - в середину трека
+        incremental = track_of(self.run)
+
+        recompute_track(self.run)
+        self.assertEqual(incremental, track_of(self.run))
+        self.assertEqual([date_time for date_time, _, _ in incremental],
+                         [START + timedelta(minutes=minute) for minute in range(6)])
+
+    def test_only_previous_point_and_later_points_are_read(self):
+        create_positions(self.run, make_points(self.run, range(50)))
+
+        prev, later = stored_track_from(self.run, START + timedelta(minutes=40, seconds=30))
+        self.assertEqual(prev.date_time, START + timedelta(minutes=40))
+        self.assertEqual([position.date_time for position in later],
+                         [START + timedelta(minutes=minute) for minute in range(41, 50)])
+
+
+class RunAggregatesTest(TestCase):
+    def setUp(self):
+        self.athlete = User.objects.create(username='athlete')
+        self.run = Run.objects.create(athlete=self.athlete, comment='run', status='in_progress')
+
+    def assert_aggregates_match_track(self):
+        # Агрегаты, накопленные при загрузке точек, должны совпадать с полным проходом по треку
+        run = Run.objects.get(pk=self.run.pk)
+        scan = Position.objects.filter(run=run).aggregate(count=Count('id'), first=Min('date_time'),
+                                                          last=Max('date_time'), speed_sum=Sum('speed'))
+        last_distance = Position.objects.filter(run=run).order_by('-date_time', '-id').values_list(
+            'distance', flat=True).first()
+
+        self.assertEqual(run.positions_count, scan['count'])
+        self.assertEqual(run.first_position_at, scan['first'])
+        self.assertEqual(run.last_position_at, scan['last'])
+        self.assertAlmostEqual(run.speed_sum, scan['speed_sum'] or 0.0)
+        self.assertEqual(run.last_distance, last_distance or 0.0)
+
+    def test_aggregates_follow_batches_and_edits(self):
+        create_positions(self.run, make_points(self.run, [0, 2, 5]))
+        self.assert_aggregates_match_track()
+
+        create_positions(self.run, make_points(self.run, [1, 3, 7]))  # Частично "из прошлого"
+        self.assert_aggregates_match_track()
+
+        Position.objects.filter(run=self.run, date_time=START + timedelta(minutes=7)).delete()
+        recompute_track(self.run)
+        self.assert_aggregates_match_track()
+
+    def test_stop_uses_aggregates(self):
+        create_positions(self.run, make_points(self.run, [0, 3, 1, 6]))
+
+        response = APIClient().post(f'/api/runs/{self.run.id}/stop/')
+        self.assertEqual(response.status_code, 200)
+
+        run = Run.objects.get(pk=self.run.pk)
+        self.assertEqual(run.status, 'finished')
+        self.assertEqual(run.run_time_seconds, 6 * 60)
+        self.assertEqual(run.speed, round(Position.objects.filter(run=run).aggregate(speed=Avg('speed'))['speed'], 2))
+        self.assertEqual(run.distance, track_of(run)[-1][2])
+
+
+class ChallengeAwardTest(TestCase):
+    def setUp(self):
+        self.athlete = User.objects.create(username='athlete')
+
+    def finish_run(self, distance=1.0, run_time_seconds=900):
+        run = Run.objects.create(athlete=self.athlete, comment='run', status='finished', distance=distance,
+                                 run_time_seconds=run_time_seconds, speed=2.5)
+        return process_finished_run(run)
+
+    def awarded(self):
+        return list(Challenge.objects.filter(athlete=self.athlete).values_list('full_name', flat=True))
+
+    def test_tenth_run_is_awarded_once(self):
+        for _ in range(9):
+            self.finish_run()
+        self.assertEqual(self.awarded(), [])
+
+        self.finish_run()
+        self.finish_run()
+        self.assertEqual(self.awarded(), ['Сделай 10 Забегов!'])
+
+        stats = UserStats.objects.get(user=self.athlete)
+        self.assertEqual(stats.runs_finished, 11)
+        self.assertAlmostEqual(stats.total_distance, 11.0)
+        self.assertAlmostEqual(stats.avg_speed, 2.5)
+
+    def test_rules_use_counters_and_the_finished_run(self):
+        self.finish_run(distance=48.0)
+        self.finish_run(distance=2.0, run_time_seconds=600)
+        self.assertEqual(sorted(self.awarded()), ['2 километра за 10 минут!', 'Пробеги 50 километров!'])
+
+    def test_counters_follow_rules_and_readers(self):
+        counters = maintained_counters()
+        self.assertEqual(counters, [counter for counter in COUNTERS if counter in counters])
+        self.assertLessEqual({'runs_finished', 'speed_sum', 'avg_speed'}, set(counters))
+
+        with self.assertRaises(ValueError):
+            challenge('Неизвестный счетчик', counters=('total_run_time',))
+
+
+@job('test_noop')
+def noop_job(job):
+    pass
+
+
+class JobRetentionTest(TestCase):
+    def run_queue(self):
+        for claimed in claim():
+            self.assertTrue(execute(claimed))
+
+    def test_keyless_jobs_are_deleted_when_done(self):
+        enqueue('test_noop')
+        keyed = enqueue('test_noop', key='test_noop:1')
+        self.run_queue()
+
+        self.assertEqual(list(Job.objects.values_list('id', 'status')), [(keyed.id, 'done')])
+        self.assertEqual(enqueue('test_noop', key='test_noop:1').id, keyed.id)  # Повтор с тем же ключом не выполняется
+
+    def test_purge_removes_old_finished_jobs(self):
+        old = enqueue('test_noop', key='test_noop:old')
+        recent = enqueue('test_noop', key='test_noop:recent')
+        pending = enqueue('test_noop', key='test_noop:pending')
+        Job.objects.filter(pk__in=[old.pk, recent.pk]).update(status='done')
+        Job.objects.filter(pk__in=[old.pk, pending.pk]).update(updated_at=django_timezone.now() - timedelta(days=30))
+
+        self.assertEqual(purge(timedelta(days=7)), 1)
+        self.assertEqual(set(Job.objects.values_list('id', flat=True)), {recent.id, pending.id})
+
+
+class UserDetailQueriesTest(TestCase):
+    def setUp(self):
+        self.coach = User.objects.create(username='coach', is_staff=True)
+        self.athletes = [User.objects.create(username=f'athlete{number}') for number in range(3)]
+        for athlete in self.athletes:
+            Subscription.objects.create(athlete=athlete, coach=self.coach)
+
+        item = CollectibleItem.objects.create(name='item', uid='1', latitude=55, longitude=37,
+                                              picture='http://example.com/item.png', value=1)
+        item.collected_by.add(self.athletes[0])
+
+    def test_athlete_detail(self):
+        # Пользователь, его предметы и подписки
+        with self.assertNumQueries(3):
+            response = APIClient().get(f'/api/users/{self.athletes[0].id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'athlete')
+        self.assertEqual(response.data['coach'], self.coach.id)
+        self.assertEqual([item['name'] for item in response.data['items']], ['item'])
+
+    def test_coach_detail(self):
+        # Пользователь и его подписчики
+        with self.assertNumQueries(2):
+            response = APIClient().get(f'/api/users/{self.coach.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'coach')
+        self.assertEqual(response.data['athletes'], [athlete.id for athlete in self.athletes])
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        self.athletes = [User.objects.create(username=f'athlete{number}') for number in range(3)]
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        for user, distance in zip(self.athletes + [self.staff], [5.0, 9.0, 7.0, 100.0]):
+            run = Run.objects.create(athlete=user, comment='run', status='finished', distance=distance,
+                                     run_time_seconds=1800, speed=3.0)
+            process_finished_run(run)
+
+    def board(self, **params):
+        response = APIClient().get('/api/leaderboard/distance/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranks_exclude_staff(self):
+        data = self.board(athlete=self.athletes[0].id)
+        self.assertEqual([(row['rank'], row['athlete']) for row in data['results']],
+                         [(1, self.athletes[1].id), (2, self.athletes[2].id), (3, self.athletes[0].id)])
+        self.assertEqual(data['me']['rank'], 3)
+
+    def test_non_numeric_ids_are_rejected(self):
+        for params in ({'coach': 'abc'}, {'athlete': 'abc'}):
+            self.assertEqual(APIClient().get('/api/leaderboard/distance/', params).status_code, 400)
+
+    def test_rank_count_does_not_join_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rank_of('total_distance', 5.0), 3)
+        self.assertNotIn('auth_user', queries[0]['sql'])
+
+    def test_promoted_user_leaves_the_board(self):
+        self.athletes[1].is_staff = True
+        self.athletes[1].save()
+        self.assertEqual([row['athlete'] for row in self.board()['results']], [self.athletes[2].id, self.athletes[0].id])
+
+        self.staff.is_staff = False
+        self.staff.save(update_fields=['is_staff'])
+        self.assertEqual(self.board()['results'][0]['athlete'], self.staff.id)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.athlete = User.objects.create(username='athlete', first_name='Ann')
+        self.run = Run.objects.create(athlete=self.athlete, comment='run', status='in_progress')
+        create_positions(self.run, make_points(self.run, [0, 1, 2]))
+
+    def revalidate(self, url):
+        # Первый запрос и повтор с полученным ETag
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_resources_return_304(self):
+        Run.objects.filter(pk=self.run.pk).update(status='finished')
+        for url in ('/api/runs/', f'/api/runs/{self.run.id}/', f'/api/positions/?run={self.run.id}'):
+            response, repeated = self.revalidate(url)
+            self.assertEqual(repeated.status_code, 304, url)
+            # Завершенные забеги можно изменить через API, поэтому только кеширование с перепроверкой по ETag
+            self.assertNotIn('Last-Modified', response)
+            self.assertNotIn('immutable', response['Cache-Control'])
+            self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_runs_list_version_reads_only_the_page(self):
+        response = self.client.get('/api/runs/')
+        with CaptureQueriesContext(connection) as queries:
+            repeated = self.client.get('/api/runs/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT', queries[0]['sql'])
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
+    def test_runs_list_changes_after_athlete_rename(self):
+        response, _ = self.revalidate('/api/runs/')
+
+        self.athlete.first_name = 'Anna'
+        self.athlete.save()
+        self.assertEqual(self.client.get('/api/runs/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_runs_list_changes_after_delete(self):
+        Run.objects.create(athlete=self.athlete, comment='second', status='init')
+        response, _ = self.revalidate('/api/runs/')
+
+        Run.objects.filter(comment='second').delete()
+        self.assertEqual(self.client.get('/api/runs/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_run_detail_changes_after_athlete_rename(self):
+        response, _ = self.revalidate(f'/api/runs/{self.run.id}/')
+
+        self.athlete.first_name = 'Anna'
+        self.athlete.save()
+        response = self.client.get(f'/api/runs/{self.run.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['athlete_data']['first_name'], 'Anna')
+
+    def test_positions_change_after_new_points(self):
+        response, _ = self.revalidate(f'/api/positions/?run={self.run.id}')
+
+        create_positions(self.run, make_points(self.run, [3]))
+        response = self.client.get(f'/api/positions/?run={self.run.id}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class ResponseCacheInvalidationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.athlete = User.objects.create(username='athlete', first_name='Ann')
+
+    def get(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url)
+
+    def test_saved_user_invalidates_cached_list(self):
+        self.assertEqual(self.get('/api/users/')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/users/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.athlete.first_name = 'Anna'
+            self.athlete.save()
+
+        response = self.get('/api/users/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['first_name'], 'Anna')
+
+    def test_run_delete_removes_track_in_one_query(self):
+        run = Run.objects.create(athlete=self.athlete, comment='run', status='in_progress')
+        create_positions(run, make_points(run, range(20)))
+
+        with CaptureQueriesContext(connection) as queries:
+            run.delete()
+        position_queries = [query['sql'] for query in queries if 'app_run_position' in query['sql']]
+        self.assertEqual(len(position_queries), 1)
+        self.assertTrue(position_queries[0].startswith('DELETE'))
+        self.assertFalse(Position.objects.exists())
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        athlete = User.objects.create(username='athlete')
+        self.run = Run.objects.create(athlete=athlete, comment='run', status='in_progress')
+        create_positions(self.run, make_points(self.run, range(30)))
+
+    def test_large_responses_are_gzipped_with_random_padding(self):
+        url = f'/api/positions/?run={self.run.id}'
+        plain = self.client.get(url)
+        first, *others = (self.client.get(url, HTTP_ACCEPT_ENCODING='gzip') for _ in range(5))
+
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertIn('Accept-Encoding', first['Vary'])
+        # Случайные байты в заголовке gzip (защита от BREACH) меняют сжатый ответ от запроса к запросу.
+        # Длина случайная, поэтому два ответа могут совпасть, но не все пять
+        self.assertGreater(len({response.content for response in [first, *others]}), 1)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get(f'/api/runs/{self.run.id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class PackedBatchTest(TestCase):
+    def setUp(self):
+        athlete = User.objects.create(username='athlete')
+        self.run = Run.objects.create(athlete=athlete, comment='run', status='in_progress')
+
+    def post(self, start, offsets):
+        payload = PACKED_BATCH_HEADER.pack(PACKED_BATCH_MAGIC, PACKED_BATCH_VERSION, self.run.id, len(offsets), start)
+        payload += b''.join(PACKED_BATCH_RECORD.pack(550000 + number, 370000, offset)
+                            for number, offset in enumerate(offsets))
+        return APIClient().post('/api/positions/bulk/', payload, content_type='application/x-packed-positions')
+
+    def test_batch_is_created(self):
+        start = int(START.timestamp() * 1000)
+        response = self.post(start, [0, 1000, 2000])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([date_time for date_time, _, _ in track_of(self.run)],
+                         [START + timedelta(seconds=second) for second in range(3)])
+
+    def test_time_out_of_range_is_rejected(self):
+        last_day = int((datetime(9999, 12, 31, tzinfo=timezone.utc) - EPOCH).total_seconds() * 1000)
+        for start, offsets in ((2 ** 62, [0]), (-2 ** 62, [0]), (last_day, [0, 2 ** 31 - 1])):
+            response = self.post(start, offsets)
+            self.assertEqual(response.status_code, 400, start)
+        self.assertFalse(Position.objects.exists())
+
+
+class BulkPositionsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.athlete = User.objects.create(username='athlete')
+        self.run = Run.objects.create(athlete=self.athlete, comment='run', status='in_progress')
+
+    def post(self, minutes, run=None, latitude=None):
+        points = [{'latitude': latitude if latitude is not None else 55.0 + minute / 1000, 'longitude': 37.0,
+                   'date_time': (START + timedelta(minutes=minute)).strftime('%Y-%m-%dT%H:%M:%S')}
+                  for minute in minutes]
+        return self.client.post('/api/positions/bulk/', {'run': (run or self.run).id, 'positions': points},
+                                format='json')
+
+    def test_batches_continue_stored_track(self):
+        self.assertEqual(self.post([0, 1, 2]).status_code, 201)
+        response = self.post([3, 4])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+
+        incremental = track_of(self.run)
+        recompute_track(self.run)
+        self.assertEqual(incremental, track_of(self.run))
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        counts = []
+        for minutes in (range(5), range(100, 150)):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(minutes).status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_batches_are_rejected(self):
+        finished = Run.objects.create(athlete=self.athlete, comment='run', status='finished')
+        self.assertEqual(self.post([0], run=finished).status_code, 400)
+        self.assertEqual(self.post([0], latitude=91.0).status_code, 400)
+        self.assertEqual(self.client.post('/api/positions/bulk/', {'run': self.run.id, 'positions': []},
+                                          format='json').status_code, 400)
+        self.assertFalse(Position.objects.exists())
+
+    def test_items_near_the_batch_are_collected(self):
+        item = CollectibleItem.objects.create(name='item', uid='1', latitude=55.001, longitude=37.0,
+                                              picture='http://example.com/item.png', value=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.post([0, 1]).status_code, 201)
+        self.assertEqual(list(item.collected_by.all()), [self.athlete])
+
+
+def xlsx_file(rows):
+    wb = openpyxl.Workbook()
+    wb.active.append(['Name', 'UID', 'Value', 'Latitude', 'Longitude', 'URL'])
+    for row in rows:
+        wb.active.append(row)
+    file = BytesIO()
+    wb.save(file)
+    return file.getvalue()
+
+
+class ImportJobTest(TestCase):
+
+    def test_progress_extends_the_job_lock(self):
+        import_job = ImportJob.objects.create(file_name='items.xlsx', file=xlsx_file([
+            ['item', 'uid1', 1, 55.0, 37.0, 'http://example.com/item.png'],
+            ['bad', 'uid2', 'x', 55.0, 37.0, 'http://example.com/item.png'],
+        ]))
+        enqueue('import_collectible_items', {'import_job_id': import_job.id}, key=f'import:{import_job.id}')
+        claimed, = claim()
+        # Импорт идет дольше LOCK_TIMEOUT: без продления блокировки задачу заберет другой воркер
+        Job.objects.filter(pk=claimed.pk).update(locked_until=django_timezone.now() - timedelta(seconds=1))
+
+        import_collectible_items_job(claimed)
+
+        self.assertGreater(Job.objects.get(pk=claimed.pk).locked_until,
+                           django_timezone.now() + LOCK_TIMEOUT - timedelta(minutes=1))
+        self.assertNotIn(claimed.id, [job.id for job in claim()])
+        import_job.refresh_from_db()
+        self.assertEqual((import_job.status, import_job.rows_processed, import_job.rows_inserted,
+                          import_job.invalid_rows_count), ('done', 2, 1, 1))
+
+
+class CollectibleMatchingTest(TestCase):
+    def test_import_is_matched_in_one_job(self):
+        athlete = User.objects.create(username='athlete')
+        run = Run.objects.create(athlete=athlete, comment='run', status='in_progress')
+        create_positions(run, make_points(run, range(10)))
+        Job.objects.all().delete()
+
+        upload = BytesIO(xlsx_file([[f'item{number}', f'uid{number}', 1, 55.0 + number / 1000, 37.0,
+                                     'http://example.com/item.png'] for number in range(0, 10, 3)]
+                                   + [['far', 'far', 1, 56.0, 38.0, 'http://example.com/item.png']]))
+        upload.name = 'items.xlsx'
+        response = APIClient().post('/api/upload_file/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Job.objects.filter(kind='match_collectibles').count(), 1)
+        for claimed in claim():
+            self.assertTrue(execute(claimed))
+        self.assertEqual(sorted(athlete.collected_items.values_list('uid', flat=True)),
+                         ['uid0', 'uid3', 'uid6', 'uid9'])
+
+
+class NearestCollectiblesTest(TestCase):
+    def setUp(self):
+        # Предметы к северу от точки (55, 37) через каждые ~111 м и один далеко
+        for number in range(5):
+            CollectibleItem.objects.create(name=f'item{number}', uid=f'uid{number}', latitude=55.0 + number / 1000,
+                                           longitude=37.0, picture='http://example.com/item.png', value=1)
+        CollectibleItem.objects.create(name='far', uid='far', latitude=56.0, longitude=37.0,
+                                       picture='http://example.com/item.png', value=1)
+
+    def near(self, **params):
+        return APIClient().get('/api/collectible_item/', {'near': '55.0,37.0', **params})
+
+    def test_items_are_sorted_by_distance_within_radius(self):
+        response = self.near(radius=300)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['uid'] for item in response.data], ['uid0', 'uid1', 'uid2'])
+        self.assertEqual([round(item['distance'] / 100) for item in response.data], [0, 1, 2])
+
+        self.assertEqual([item['uid'] for item in self.near(limit=2).data], ['uid0', 'uid1'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'near': 'abc'}, {'near': '55.0'}, {'near': '91,37'}, {'radius': 0}, {'radius': 100000},
+                       {'limit': 'x'}, {'limit': 1000}):
+            self.assertEqual(self.near(**params).status_code, 400, params)
+
+
+class CoachAnalyticsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.coach = User.objects.create(username='coach', is_staff=True)
+        self.athletes = [User.objects.create(username=f'athlete{number}') for number in range(2)]
+
+    def analytics(self):
+        response = self.client.get(f'/api/analytics_for_coach/{self.coach.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def subscribe(self, athlete):
+        response = self.client.post(f'/api/subscribe_to_coach/{self.coach.id}/', {'athlete': athlete.id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_coach_without_subscribers(self):
+        self.assertEqual(self.analytics(), {'longest_run_user': None, 'longest_run_value': None,
+                                            'total_run_user': None, 'total_run_value': None,
+                                            'speed_avg_user': None, 'speed_avg_value': None})
+
+    def test_analytics_follow_stop_and_subscribe(self):
+        self.subscribe(self.athletes[0])
+        run = Run.objects.create(athlete=self.athletes[0], comment='run', status='in_progress')
+        create_positions(run, make_points(run, range(5)))
+        self.assertEqual(self.analytics()['longest_run_value'], 0.0)  # Забег еще не завершен, дистанции нет
+
+        self.assertEqual(self.client.post(f'/api/runs/{run.id}/stop/').status_code, 200)
+        data = self.analytics()
+        self.assertEqual(data['longest_run_user'], self.athletes[0].id)
+        self.assertGreater(data['longest_run_value'], 0.0)
+        self.assertEqual(data['longest_run_value'], Run.objects.get(pk=run.pk).distance)
+
+        longer = Run.objects.create(athlete=self.athletes[1], comment='run', status='finished', distance=100.0,
+                                    run_time_seconds=3600, speed=3.0)
+        self.subscribe(self.athletes[1])
+        data = self.analytics()
+        self.assertEqual((data['longest_run_user'], data['longest_run_value']), (self.athletes[1].id, longer.distance))
+
+
+class ChallengesSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.athletes = [User.objects.create(username=f'athlete{number}', first_name='A', last_name=str(number))
+                         for number in range(5)]
+        for athlete in self.athletes:
+            Challenge.objects.create(athlete=athlete, full_name='Сделай 10 Забегов!')
+        Challenge.objects.create(athlete=self.athletes[0], full_name='Пробеги 50 километров!')
+
+    def summary(self, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/api/challenges_summary/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def usernames(self, group):
+        return [athlete['username'] for athlete in group['athletes']]
+
+    def test_athletes_are_paged_within_each_challenge(self):
+        first, second = self.summary(size=2)
+        self.assertEqual((first['name_to_display'], first['athletes_count']), ('Сделай 10 Забегов!', 5))
+        self.assertEqual(self.usernames(first), ['athlete0', 'athlete1'])
+        self.assertEqual((second['athletes_count'], self.usernames(second)), (1, ['athlete0']))
+
+        group, = self.summary(size=2, offset=4)
+        self.assertEqual(self.usernames(group), ['athlete4'])
+
+        group, = self.summary(name='Пробеги 50 километров!')
+        self.assertEqual(group['athletes'], [{'id': self.athletes[0].id, 'full_name': 'A 0', 'username': 'athlete0'}])
+
+    def test_new_challenge_invalidates_summary(self):
+        self.assertEqual(self.summary()[1]['athletes_count'], 1)
+
+        for number in range(10):
+            run = Run.objects.create(athlete=self.athletes[1], comment='run', status='finished', distance=5.0,
+                                     run_time_seconds=1800, speed=3.0)
+            with self.captureOnCommitCallbacks(execute=True):
+                process_finished_run(run)
+        self.assertEqual(self.summary()[1]['athletes_count'], 2)
+
+    def test_evicted_version_does_not_reuse_stale_summary(self):
+        self.summary()
+        Challenge.objects.create(athlete=self.athletes[1], full_name='Пробеги 50 километров!')
+        cache.delete('response_cache:version:app_run.challenge')  # Версию вытеснили из кеша
+        self.assertEqual(self.summary()[1]['athletes_count'], 2)
+
+    def test_invalid_paging_is_rejected(self):
+        for params in ({'size': 0}, {'size': 1001}, {'size': 'x'}, {'offset': -1}):
+            self.assertEqual(self.client.get('/api/challenges_summary/', params).status_code, 400, params)
+
+
+class TrainingSeriesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.coach = User.objects.create(username='coach', is_staff=True)
+        self.athletes = [User.objects.create(username=f'athlete{number}') for number in range(2)]
+        for athlete in self.athletes:
+            Subscription.objects.create(athlete=athlete, coach=self.coach)
+
+        # Понедельник и вторник одной недели у первого атлета, вторник у второго
+        for athlete, day, distance in ((self.athletes[0], 1, 5.0), (self.athletes[0], 2, 3.0),
+                                       (self.athletes[1], 2, 10.0)):
+            run = Run.objects.create(athlete=athlete, comment='run', status='finished', distance=distance,
+                                     run_time_seconds=1800, speed=distance / 2)
+            Run.objects.filter(pk=run.pk).update(created_at=datetime(2024, 1, day, 12, 0, tzinfo=timezone.utc))
+            add_run(Run.objects.get(pk=run.pk))
+
+    def series(self, url, **params):
+        response = self.client.get(url, {'from': '2024-01-01', 'to': '2024-01-31', **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['period'], row['runs'], row['distance']) for row in response.json()]
+
+    def test_athlete_and_coach_series(self):
+        self.assertEqual(self.series(f'/api/athletes/{self.athletes[0].id}/training/'),
+                         [('2024-01-01', 1, 5.0), ('2024-01-02', 1, 3.0)])
+        self.assertEqual(self.series(f'/api/coaches/{self.coach.id}/training/', period='week'),
+                         [('2024-01-01', 3, 18.0)])
+
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/coaches/{self.coach.id}/training/')
+
+    def test_rebuild_matches_incremental_rollups(self):
+        def rollups():
+            return [list(model.objects.order_by('athlete', 'period')
+                         .values_list('athlete', 'period', 'runs', 'distance', 'run_time_seconds', 'max_speed'))
+                    for model in (DailyRollup, WeeklyRollup)]
+
+        incremental = rollups()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollups())
+
+    def test_invalid_requests(self):
+        url = f'/api/athletes/{self.athletes[0].id}/training/'
+        for params in ({'from': 'abc'}, {'from': '2024-13-01'}, {'period': 'month'},
+                       {'from': '2030-01-01', 'to': '2020-01-01'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+        self.assertEqual(self.client.get(f'/api/coaches/{self.athletes[0].id}/training/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/athletes/{self.coach.id}/training/').status_code, 404)
+
+
+class PackedTrackTest(TestCase):
+    def test_long_track_is_packed(self):
+        # Случайная точка через 30 дней: смещение больше, чем помещается в int32 миллисекунд
+        athlete = User.objects.create(username='athlete')
+        run = Run.objects.create(athlete=athlete, comment='run', status='in_progress')
+        create_positions(run, [Position(run=run, latitude=Decimal('55.0000'), longitude=Decimal('37.0000'),
+                                        date_time=START + timedelta(days=days)) for days in (0, 30)])
+
+        response = APIClient().get(f'/api/positions/?run={run.id}&format=packed')
+        self.assertEqual(response.status_code, 200)
 
-# Create your tests here.
+        _, version, count, start = PACKED_HEADER.unpack_from(response.content)
+        offsets = struct.unpack_from(f'<{count}q', response.content, PACKED_HEADER.size + count * 8)
+        self.assertEqual((version, count, start), (PACKED_VERSION, 2, int(START.timestamp() * 1000)))
+        self.assertEqual(offsets, (0, 30 * 24 * 60 * 60 * 1000))
@@ -0,0 +1,216 @@
+from django.db import transaction
+from django.db.models import F, Max, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+from geographiclib.geodesic import Geodesic
+from geopy.distance import geodesic
+
+from .geo import bounding_box, cells_around
+from .jobs import job, enqueue, checkpoint
+from .response_cache import bump_model_versions
+from .models import Run, Position, CollectibleItem
+
+COLLECT_RADIUS = 100  # Радиус в метрах, в котором бегун собирает CollectibleItem
+MATCH_CHUNK_SIZE = 50000  # Диапазон id точек, который просматривается за один запрос
+
+
+TRACK_FIELDS = ('id', 'latitude', 'longitude', 'date_time', 'speed', 'distance')
+
+
+def stored_track_from(run, date_time):
+    # Одним упорядоченным запросом получаем последнюю сохраненную точку до date_time (от нее продолжается трек)
+    # и все точки начиная с date_time, которые придется пересчитать, если новая точка вставляется "в прошлое"
+    prev_time = (Position.objects.filter(run=run, date_time__lt=date_time)
+                 .order_by('-date_time').values('date_time')[:1])
+    stored = list(Position.objects
+                  .filter(run=run, date_time__gte=Coalesce(Subquery(prev_time), Value(date_time)))
+                  .order_by('date_time', 'id')
+                  .only(*TRACK_FIELDS))
+
+    earlier = [position for position in stored if position.date_time < date_time]
+    prev = earlier[-1] if earlier else None
+    return prev, stored[len(earlier):]
+
+
+def segment_distances(latitudes, longitudes):
+    # Длины (в км) всех отрезков трека за один проход. Считаем тем же эллипсоидом WGS-84, что и geopy.geodesic,
+    # но вызываем geographiclib напрямую, без создания объектов geopy.Point на каждую точку
+    inverse = Geodesic.WGS84.Inverse
+    latitudes = [float(latitude) for latitude in latitudes]
+    longitudes = [float(longitude) for longitude in longitudes]
+
+    return [inverse(lat1, lon1, lat2, lon2, Geodesic.DISTANCE)['s12'] / 1000
+            for lat1, lon1, lat2, lon2 in zip(latitudes, longitudes, latitudes[1:], longitudes[1:])]
+
+
+def fill_track(prev, positions):
+    # Один проход по упорядоченным по времени точкам: считаем накопленную дистанцию и скорость,
+    # продолжая от точки prev (если ее нет - трек начинается с нуля)
+    if not positions:
+        return positions
+
+    track = [prev] + positions if prev else positions
+    segments = segment_distances([position.latitude for position in track],
+                                 [position.longitude for position in track])
+
+    if not prev:
+        positions[0].speed = 0.0
+        positions[0].distance = 0.0
+
+    for prev, position, segment_distance in zip(track, track[1:], segments):
+        time_delta = (position.date_time - prev.date_time).total_seconds()
+        speed = segment_distance * 1000 / time_delta if time_delta > 0 else 0.0
+        distance = prev.distance + segment_distance
+
+        position.speed = round(speed, 2)
+        position.distance = round(distance, 2)
+
+    return positions
+
+
+def recompute_track(run):
+    # Полный пересчет накопленной дистанции и скорости всех точек забега и агрегатов забега
+    # (например, после изменения или удаления точки): один упорядоченный запрос и один bulk_update
+    with transaction.atomic():
+        Run.objects.select_for_update().filter(pk=run.pk).exists()  # Блокируем забег от параллельной загрузки точек
+        positions = list(Position.objects.filter(run=run).order_by('date_time', 'id').only(*TRACK_FIELDS))
+
+        fill_track(None, positions)
+        Position.objects.bulk_update(positions, ['speed', 'distance'], batch_size=1000)
+        bump_model_versions(Run, Position)
+
+        Run.objects.filter(pk=run.pk).update(
+            positions_count=len(positions),
+            first_position_at=positions[0].date_time if positions else None,
+            last_position_at=positions[-1].date_time if positions else None,
+            last_distance=positions[-1].distance if positions else 0.0,
+            speed_sum=sum(position.speed for position in positions),
+            positions_version=F('positions_version') + 1,
+            updated_at=timezone.now(),
+        )
+
+    return positions
+
+
+def create_positions(run, positions):
+    # Сохраняем точки одного забега одной транзакцией и одним INSERT. Если точки пришли не по порядку,
+    # пересчитываем только хвост трека от самой ранней новой точки до конца
+    positions = sorted(positions, key=lambda position: position.date_time)
+    first_time, last_time = positions[0].date_time, positions[-1].date_time
+
+    with transaction.atomic():
+        Run.objects.select_for_update().filter(pk=run.pk).exists()  # Блокируем забег от параллельной загрузки точек
+        prev, later = stored_track_from(run, first_time)
+        later_speed = sum(position.speed for position in later)
+
+        # Сортировка стабильная: при равном времени сохраненные точки идут раньше новых, как при order_by('date_time', 'id')
+        track = fill_track(prev, sorted(later + positions, key=lambda position: position.date_time))
+
+        positions = Position.objects.bulk_create(positions)
+        if later:
+            Position.objects.bulk_update(later, ['speed', 'distance'], batch_size=1000)
+        bump_model_versions(Run, Position)  # bulk_create и update() не посылают сигналы
+
+        # Поддерживаем агрегаты забега, чтобы остановка забега не сканировала трек
+        Run.objects.filter(pk=run.pk).update(
+            positions_count=F('positions_count') + len(positions),
+            first_position_at=Least(Coalesce('first_position_at', Value(first_time)), Value(first_time)),
+            last_position_at=Greatest(Coalesce('last_position_at', Value(last_time)), Value(last_time)),
+            last_distance=track[-1].distance,
+            speed_sum=F('speed_sum') + sum(position.speed for position in track) - later_speed,
+            positions_version=F('positions_version') + 1,
+            updated_at=timezone.now(),
+        )
+
+        # Поиск CollectibleItem рядом с новыми точками выполняется в фоне
+        enqueue('collect_items', {'athlete_id': run.athlete_id,
+                                  'position_ids': [position.id for position in positions]})
+
+    return positions
+
+
+def collect_items(athlete_id, positions):
+    # Проверяем есть ли CollectibleItem на расстоянии <= COLLECT_RADIUS хотя бы от одной из точек.
+    # Кандидатов выбираем по индексу (lat_cell, lon_cell) только из соседних ячеек сетки
+    cells = set()
+    for position in positions:
+        cells |= cells_around(position.latitude, position.longitude, COLLECT_RADIUS)
+
+    candidates = (CollectibleItem.objects
+                  .filter(lat_cell__in={lat_cell for lat_cell, _ in cells},
+                          lon_cell__in={lon_cell for _, lon_cell in cells})
+                  .exclude(collected_by=athlete_id)  # Уже собранные предметы не проверяем
+                  .only('id', 'latitude', 'longitude', 'lat_cell', 'lon_cell'))
+
+    points = [(position.latitude, position.longitude) for position in positions]
+    items = [item for item in candidates
+             if (item.lat_cell, item.lon_cell) in cells
+             and any(geodesic(point, (item.latitude, item.longitude)).meters <= COLLECT_RADIUS for point in points)]
+
+    if items:
+        # Все новые связи collected_by добавляем одним INSERT
+        through = CollectibleItem.collected_by.through
+        through.objects.bulk_create([through(collectibleitem_id=item.id, user_id=athlete_id) for item in items],
+                                    ignore_conflicts=True)
+
+
+@job('collect_items')
+def collect_items_job(job):
+    positions = Position.objects.filter(id__in=job.payload['position_ids']).only('latitude', 'longitude')
+    collect_items(job.payload['athlete_id'], list(positions))
+
+
+def enqueue_collectible_matching(min_item_id, max_item_id):
+    # Новые или перемещенные предметы с id из диапазона сопоставляем с уже сохраненными точками в фоне.
+    # Весь импорт - одна задача, поэтому Position просматривается один раз
+    enqueue('match_collectibles', {'min_item_id': min_item_id, 'max_item_id': max_item_id})
+
+
+@job('match_collectibles', atomic=False)
+def match_collectibles_job(job):
+    # Пространственное соединение предметов с точками: один проход по Position диапазонами id по первичному ключу.
+    # В SQL отбираем только точки внутри общего ограничивающего прямоугольника всех предметов, а каждую точку
+    # проверяем только против предметов соседних ячеек сетки (items_by_cell), точное расстояние считаем в Python.
+    # После каждого диапазона сохраняем прогресс, поэтому после сбоя задача продолжит с того же места
+    if 'item_ids' in job.payload:  # Задачи, поставленные в очередь до перехода на диапазон id
+        items = CollectibleItem.objects.filter(id__in=job.payload['item_ids'])
+    else:
+        items = CollectibleItem.objects.filter(id__range=(job.payload['min_item_id'], job.payload['max_item_id']))
+    items = list(items.only('id', 'latitude', 'longitude', 'lat_cell', 'lon_cell'))
+    if not items:
+        return
+
+    items_by_cell = {}
+    for item in items:
+        items_by_cell.setdefault((item.lat_cell, item.lon_cell), []).append(item)
+
+    boxes = [bounding_box(item.latitude, item.longitude, COLLECT_RADIUS) for item in items]
+    in_bounds = Q(latitude__range=(min(box[0] for box in boxes), max(box[1] for box in boxes)),
+                  longitude__range=(min(box[2] for box in boxes), max(box[3] for box in boxes)))
+
+    if 'max_position_id' not in job.payload:
+        # Точки, сохраненные после постановки задачи, уже проверяются при загрузке
+        checkpoint(job, max_position_id=Position.objects.aggregate(max_id=Max('id'))['max_id'] or 0,
+                   last_position_id=0)
+
+    through = CollectibleItem.collected_by.through
+    last_id, max_id = job.payload['last_position_id'], job.payload['max_position_id']
+
+    while last_id < max_id:
+        chunk_end = min(last_id + MATCH_CHUNK_SIZE, max_id)
+        positions = (Position.objects.filter(id__gt=last_id, id__lte=chunk_end).filter(in_bounds)
+                     .values_list('latitude', 'longitude', 'run__athlete_id'))
+
+        collected = set()
+        for latitude, longitude, athlete_id in positions:
+            for cell in cells_around(latitude, longitude, COLLECT_RADIUS):
+                for item in items_by_cell.get(cell, ()):
+                    if (item.id, athlete_id) not in collected and \
+                            geodesic((latitude, longitude), (item.latitude, item.longitude)).meters <= COLLECT_RADIUS:
+                        collected.add((item.id, athlete_id))
+
+        through.objects.bulk_create([through(collectibleitem_id=item_id, user_id=athlete_id)
+                                     for item_id, athlete_id in collected], ignore_conflicts=True)
+
+        last_id = chunk_end
+        checkpoint(job, last_position_id=last_id)
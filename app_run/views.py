@@ -1,22 +1,40 @@
+from datetime import timedelta
+
 from rest_framework import viewsets, status
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
 from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.views import APIView
-from geopy.distance import geodesic
-from django.db.models import Sum, Count, Q, Avg, Max
-import openpyxl
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.db.models.functions import Coalesce
 
-from .models import Run, User, AthleteInfo, Challenge, Position, CollectibleItem, Subscription
+from .models import Run, User, AthleteInfo, Challenge, Position, CollectibleItem, Subscription, ImportJob, UserStats
 from .serializers import RunSerializer, UserSerializer, AthleteInfoSerializer, ChallengeSerializer, PositionSerializer, \
-    CollectibleItemSerializer, UserDetailSerializer, AthleteDetailSerializer, CoachDetailSerializer
+    CollectibleItemSerializer, UserDetailSerializer, AthleteDetailSerializer, CoachDetailSerializer, \
+    PositionBatchSerializer, PackedPositionBatchSerializer, ImportJobSerializer
+from .track import create_positions, recompute_track, enqueue_collectible_matching
+from .jobs import enqueue, queue_depth
+from .challenges import challenges_summary
+from .stats import update_coach_rating, coach_analytics, invalidate_coach_analytics
+from .imports import read_xlsx_rows, import_collectible_items
+from .geo import bounding_box, cell_ranges, distance_meters
+from .leaderboards import BOARDS, board_queryset, rank_rows, my_rank
+from .rollups import ROLLUPS, training_series
+from .conditional import ConditionalGetMixin, runs_version, run_version, positions_version
+from .response_cache import cache_response, cache_stats, bump_model_versions
+from .fast_serializers import FastListMixin, RunValuesSerializer, UserValuesSerializer, PositionValuesSerializer
+from .columnar import ColumnarTrackMixin, TRACK_RENDERERS, PackedPositionBatch, PackedPositionBatchParser
 
 
 @api_view(['GET'])
+@cache_response()
 def company_details(request):
     details = {'company_name': settings.COMPANY_NAME,
                'slogan': settings.SLOGAN,
@@ -25,17 +43,37 @@ def company_details(request):
     return Response(details)
 
 
-class UserPagination(PageNumberPagination):
+class KeysetPagination(CursorPagination):
+    # Курсорная пагинация по (поле времени, id): без OFFSET и без COUNT(*) по всей выборке
+    page_size = 100
     page_size_query_param = 'size'  # Разрешаем изменять количество объектов через query параметр size в url
+    max_page_size = 1000  # Ограничение сверху, чтобы один запрос не мог забрать всю таблицу
 
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+
+        # При сортировке через ?ordering= добавляем id в том же направлении, чтобы порядок был однозначным
+        if not {'id', '-id'} & set(ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+
+class UserPagination(KeysetPagination):
+    ordering = ('date_joined', 'id')
 
-class RunPagination(PageNumberPagination):
-    page_size_query_param = 'size'  # Разрешаем изменять количество объектов через query параметр size в url
 
+class RunPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
 
-class RunViewSet(viewsets.ModelViewSet):
+
+class PositionPagination(KeysetPagination):
+    ordering = ('date_time', 'id')
+
+
+class RunViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Run.objects.select_related('athlete').all()
     serializer_class = RunSerializer
+    values_serializer = RunValuesSerializer()
     filter_backends = [DjangoFilterBackend,
                        OrderingFilter]  # Указываем какой класс будет использоваться для фильтра и сортировки
     pagination_class = RunPagination  # Указываем пагинацию
@@ -43,9 +81,35 @@ class RunViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'athlete']  # Поля, по которым будет происходить фильтрация
     ordering_fields = ['created_at']  # Поля по которым будет возможна сортировка
 
+    def get_list_version(self, queryset):
+        # Та же страница, что отдаст list, но только с полями, от которых зависит версия
+        page = self.paginate_queryset(queryset.only('id', 'created_at', 'updated_at', 'athlete__username',
+                                                    'athlete__first_name', 'athlete__last_name'))
+        return runs_version(page, self.paginator.get_next_link(), self.paginator.get_previous_link())
+
+    def get_object_version(self, instance):
+        return run_version(instance)
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+    # Любой забег атлета учитывается в аналитике его тренеров
+    def perform_create(self, serializer):
+        run = serializer.save()
+        invalidate_coach_analytics(athlete_id=run.athlete_id)
+
+    def perform_update(self, serializer):
+        old_athlete_id = serializer.instance.athlete_id
+        run = serializer.save()
+        invalidate_coach_analytics(athlete_id=run.athlete_id)
+        if old_athlete_id != run.athlete_id:
+            invalidate_coach_analytics(athlete_id=old_athlete_id)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_coach_analytics(athlete_id=instance.athlete_id)
+
+
+class UserViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = UserSerializer
+    values_serializer = UserValuesSerializer()
     filter_backends = [SearchFilter, OrderingFilter]  # Подключаем SearchFilter здесь
     pagination_class = UserPagination  # Указываем пагинацию
 
@@ -61,23 +125,40 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         elif user_type == 'athlete':
             qs = qs.filter(is_staff=False)
 
-        # Для решения проблемы N+1 вычисляем кол-во finished забегов здесь, а не в UserSerializer при помощи метода
-        # get_runs_finished
-        qs = qs.annotate(runs_finished=Count('run', filter=Q(run__status='finished')))
-        qs = qs.annotate(rating=Avg('subscribers__rating'))
+        # Кол-во finished забегов и рейтинг берем из заранее посчитанной таблицы UserStats одним LEFT JOIN,
+        # вместо агрегации по забегам и подпискам в каждом запросе
+        qs = qs.annotate(runs_finished=Coalesce('stats__runs_finished', 0), rating=F('stats__rating'))
         return qs
 
+    @cache_response(User, UserStats)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_serializer_class(self):
         if self.action == 'list':  # Также в запросе на api/users нужно добавить поле rating (тип float) как для list так и для detail
             return UserSerializer
-        if self.action == 'retrieve':  # Возвращаем детализированный сериализатор для метода retrieve (GET с указанием id)
-            user = self.get_object()
-            if user.is_staff:
+        # Возвращаем детализированный сериализатор для метода retrieve (GET с указанием id).
+        # Пользователь уже получен в retrieve, поэтому повторно его не запрашиваем
+        detail_user = getattr(self, 'detail_user', None)
+        if self.action == 'retrieve' and detail_user is not None:
+            if detail_user.is_staff:
                 return CoachDetailSerializer
             else:
                 return AthleteDetailSerializer
         return UserDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        self.detail_user = user = self.get_object()
+
+        # Тип пользователя известен после первого запроса, поэтому предзагружаем только связи нужного сериализатора
+        if user.is_staff:
+            prefetch_related_objects([user], Prefetch('subscribers', queryset=Subscription.objects.order_by('id')))
+        else:
+            prefetch_related_objects([user], 'collected_items',
+                                     Prefetch('subscriptions', queryset=Subscription.objects.order_by('id')))
+
+        return Response(self.get_serializer(user).data)
+
 
 class StartRunAPIView(APIView):
     def post(self, request, run_id):
@@ -98,14 +179,13 @@ class StopRunAPIView(APIView):
         if run.status in ('init', 'finished'):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        positions = Position.objects.filter(run=run).order_by('date_time')
-
-        if positions.count() >= 2:
-            total_time = (positions.last().date_time - positions.first().date_time).total_seconds()
+        # Все нужные значения уже накоплены в агрегатах забега при загрузке точек, трек не сканируем
+        if run.positions_count >= 2:
+            total_time = (run.last_position_at - run.first_position_at).total_seconds()
 
             if total_time > 0:
                 run.run_time_seconds = int(total_time)
-                avg_speed = positions.aggregate(avg_speed=Avg('speed'))['avg_speed']
+                avg_speed = run.speed_sum / run.positions_count
                 run.speed = round(avg_speed, 2) if avg_speed else 0.0
             else:
                 run.run_time_seconds = 0.0
@@ -114,26 +194,13 @@ class StopRunAPIView(APIView):
             run.run_time_seconds = 0.0
             run.speed = 0.0
 
-        run.distance = positions.last().distance if positions.exists() else 0.0
+        run.distance = run.last_distance
         run.status = 'finished'
         run.save()
+        invalidate_coach_analytics(athlete_id=run.athlete_id)
 
-        # Челлендж "Сделай 10 Забегов!"
-        finished_count = Run.objects.filter(athlete=run.athlete, status='finished').count()
-
-        if finished_count == 10:
-            Challenge.objects.get_or_create(athlete=run.athlete, full_name='Сделай 10 Забегов!')
-
-        # Челлендж "Пробеги 50 километров!"
-        finished_km = Run.objects.filter(athlete=run.athlete, status='finished').aggregate(Sum('distance'))[
-            'distance__sum']
-
-        if finished_km >= 50:
-            Challenge.objects.get_or_create(athlete=run.athlete, full_name='Пробеги 50 километров!')
-
-        # Челлендж "2 километра за 10 минут!"
-        if run.distance >= 2 and run.run_time_seconds <= 600:
-            Challenge.objects.get_or_create(athlete=run.athlete, full_name='2 километра за 10 минут!')
+        # Счетчики атлета и челленджи обновляются в фоне
+        enqueue('run_finished', {'run_id': run.id}, key=f'run_finished:{run.id}')
 
         return Response(RunSerializer(run).data, status=status.HTTP_200_OK)
 
@@ -164,6 +231,7 @@ class AthleteInfoAPIView(APIView):
 
 
 class ChallengeAPIView(APIView):
+    @cache_response(Challenge)
     def get(self, request):
         athlete_id = request.query_params.get('athlete')
 
@@ -175,9 +243,12 @@ class ChallengeAPIView(APIView):
         return Response(ChallengeSerializer(challenges, many=True).data, status=status.HTTP_200_OK)
 
 
-class PositionViewSet(viewsets.ModelViewSet):
+class PositionViewSet(ConditionalGetMixin, ColumnarTrackMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Position.objects.all()
     serializer_class = PositionSerializer
+    values_serializer = PositionValuesSerializer()
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *TRACK_RENDERERS]  # ?format=columnar|packed
+    pagination_class = PositionPagination  # Указываем пагинацию
 
     def get_queryset(self):
         run_id = self.request.query_params.get('run')
@@ -187,42 +258,105 @@ class PositionViewSet(viewsets.ModelViewSet):
 
         return self.queryset
 
-    def perform_create(self, serializer):
-        data = serializer.validated_data
-        run = data['run']
-        latitude = float(data['latitude'])
-        longitude = float(data['longitude'])
-        date_time = data['date_time']
-
-        prev = Position.objects.filter(run=run, date_time__lt=date_time).order_by('-date_time').first()
+    # Условный GET поддерживается для трека одного забега (?run=) и отдельной точки
+    def get_list_version(self, queryset):
+        run_id = self.request.query_params.get('run')
+        return positions_version(run_id) if run_id else None
 
-        if prev:
-            prev_point = (prev.latitude, prev.longitude)
-            curr_point = (latitude, longitude)
+    def get_object_version(self, instance):
+        return positions_version(instance.run_id)
 
-            segment_distance = geodesic(prev_point, curr_point).km
-            time_delta = (date_time - prev.date_time).total_seconds()
-            speed = segment_distance * 1000 / time_delta if time_delta > 0 else 0.0
-            distance = prev.distance + segment_distance
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        # Сохраняем точку тем же путем, что и пакетную загрузку, чтобы точки "из прошлого" пересчитывали хвост трека
+        serializer.instance, = create_positions(data['run'], [Position(**data)])
+
+    # Изменение и удаление точек - редкие операции, поэтому после них пересчитываем трек забега целиком
+    def perform_update(self, serializer):
+        old_run = serializer.instance.run
+        position = serializer.save()
+
+        recompute_track(position.run)
+        if old_run.pk != position.run_id:
+            recompute_track(old_run)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        recompute_track(instance.run)  # Увеличивает и версию Position: сигналов у Position нет (см. response_cache.py)
+
+    @action(detail=False, methods=['post'],
+            parser_classes=[*api_settings.DEFAULT_PARSER_CLASSES, PackedPositionBatchParser])
+    def bulk(self, request):
+        # Пакетная загрузка точек одного забега: {"run": id, "positions": [{latitude, longitude, date_time}, ...]}
+        # или тот же пакет в бинарном формате application/x-packed-positions (см. columnar.py)
+        if isinstance(request.data, PackedPositionBatch):
+            serializer = PackedPositionBatchSerializer(data={'run': request.data.run_id, 'positions': request.data})
         else:
-            speed = 0.0
-            distance = 0.0
+            serializer = PositionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        position = serializer.save(speed=round(speed, 2), distance=round(distance, 2))
+        run = serializer.validated_data['run']
+        positions = [Position(run=run, **point) for point in serializer.validated_data['positions']]
+        positions = create_positions(run, positions)
 
-        # Проверяем есть ли CollectibleItem на расстоянии <= 100 метров
-        user = position.run.athlete
-        user_location = (position.latitude, position.longitude)
-        for item in CollectibleItem.objects.all():
-            item_location = (item.latitude, item.longitude)
-            if geodesic(user_location, item_location).meters <= 100:
-                item.collected_by.add(user)
+        return Response(PositionSerializer(positions, many=True).data, status=status.HTTP_201_CREATED)
 
 
 class CollectibleItemViewSet(viewsets.ModelViewSet):
     queryset = CollectibleItem.objects.all()
     serializer_class = CollectibleItemSerializer
 
+    NEAR_DEFAULT_RADIUS = 1000  # метров
+    NEAR_MAX_RADIUS = 10000
+    NEAR_DEFAULT_LIMIT = 20
+    NEAR_MAX_LIMIT = 100
+
+    @cache_response(CollectibleItem)
+    def list(self, request, *args, **kwargs):
+        # ?near=lat,lon&radius=m&limit=k - ближайшие к точке предметы, отсортированные по расстоянию
+        if 'near' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            latitude, longitude = (float(value) for value in request.query_params['near'].split(','))
+            radius = float(request.query_params.get('radius', self.NEAR_DEFAULT_RADIUS))
+            limit = int(request.query_params.get('limit', self.NEAR_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': 'Expected near=lat,lon, numeric radius and integer limit'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0
+                and 0 < radius <= self.NEAR_MAX_RADIUS and 0 < limit <= self.NEAR_MAX_LIMIT):
+            return Response({'error': f'Coordinates out of range, radius must be in (0, {self.NEAR_MAX_RADIUS}], '
+                                      f'limit in (0, {self.NEAR_MAX_LIMIT}]'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Кандидаты: ячейки сетки по индексу (lat_cell, lon_cell) и ограничивающий прямоугольник,
+        # затем точное расстояние только для них
+        lat_cells, lon_cells = cell_ranges(latitude, longitude, radius)
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius)
+        candidates = self.get_queryset().filter(lat_cell__range=lat_cells, lon_cell__range=lon_cells,
+                                                latitude__range=(min_lat, max_lat),
+                                                longitude__range=(min_lon, max_lon))
+
+        ranked = sorted((distance_meters(latitude, longitude, item.latitude, item.longitude), item.id, item)
+                        for item in candidates)
+        nearest = [(distance, item) for distance, _, item in ranked if distance <= radius][:limit]
+
+        data = CollectibleItemSerializer([item for _, item in nearest], many=True).data
+        for item_data, (distance, _) in zip(data, nearest):
+            item_data['distance'] = round(distance, 2)
+        return Response(data)
+
+    # Новые и перемещенные предметы сопоставляем с уже сохраненными точками в фоне
+    def perform_create(self, serializer):
+        item = serializer.save()
+        enqueue_collectible_matching(item.id, item.id)
+
+    def perform_update(self, serializer):
+        item = serializer.save()
+        enqueue_collectible_matching(item.id, item.id)
+
 
 class UploadFileView(APIView):
     def post(self, request):
@@ -231,48 +365,34 @@ class UploadFileView(APIView):
         if not upload_file or not upload_file.name.endswith('xlsx'):
             return Response({'error': 'File should be .xlsx'}, status=400)
 
-        wb = openpyxl.load_workbook(upload_file)
-        sheet = wb.active
-
-        invalid_rows = []
-
-        # Получаем уже существующие пары (name, uid) для проверки дубликатов
-        existing_items = set(
-            CollectibleItem.objects.values_list('name', 'uid')
-        )
-
-        # Для отслеживания дубликатов внутри файла
-        file_items = set()
-
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            name, uid, value, latitude, longitude, picture = row
-
-            # Проверяем на дубликаты (name, uid) в базе и в файле
-            if (name, uid) in existing_items or (name, uid) in file_items:
-                invalid_rows.append(list(row))
-                continue
-
-            data = {
-                'name': name,
-                'uid': uid,
-                'value': value,
-                'latitude': latitude,
-                'longitude': longitude,
-                'picture': picture,
-            }
-
-            serializer = CollectibleItemSerializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                # Добавляем в множества, чтобы не загружать дубликаты из файла
-                existing_items.add((name, uid))
-                file_items.add((name, uid))
-            else:
-                invalid_rows.append(list(row))
+        # ?async=true: сохраняем файл и обрабатываем его в фоне, прогресс доступен по api/upload_file/<id>/
+        if request.query_params.get('async') in ('1', 'true'):
+            import_job = ImportJob.objects.create(file_name=upload_file.name, file=upload_file.read())
+            enqueue('import_collectible_items', {'import_job_id': import_job.id}, key=f'import:{import_job.id}')
+            return Response(ImportJobSerializer(import_job).data, status=status.HTTP_202_ACCEPTED)
+
+        invalid_rows, _ = import_collectible_items(read_xlsx_rows(upload_file))
 
         return Response(invalid_rows, status=200)
 
 
+class InvalidRowPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class ImportJobAPIView(APIView):
+    def get(self, request, job_id):
+        import_job = get_object_or_404(ImportJob.objects.defer('file'), id=job_id)
+
+        # Некорректные строки отдаем постранично
+        paginator = InvalidRowPagination()
+        rows = paginator.paginate_queryset(import_job.invalid_rows.all(), request, view=self)
+
+        data = ImportJobSerializer(import_job).data
+        data['invalid_rows'] = paginator.get_paginated_response([row.row for row in rows]).data
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class SubscriptionAPIView(APIView):
     def post(self, request, id):
         athlete_id = request.data.get('athlete')
@@ -292,30 +412,26 @@ class SubscriptionAPIView(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
         Subscription.objects.create(athlete=athlete, coach=coach)
+        invalidate_coach_analytics(coach_id=coach.id)
         return Response(status=status.HTTP_200_OK)
 
 
 class ChallengesSummaryAPIView(APIView):
-    def get(self, request):
-        challenges = Challenge.objects.select_related('athlete')
+    DEFAULT_ATHLETES_SIZE = 100
+    MAX_ATHLETES_SIZE = 1000
 
-        summary = {}
-        for challenge in challenges:
-            athlete = challenge.athlete
-            summary.setdefault(challenge.full_name, []).append({
-                'id': athlete.id,
-                'full_name': f'{athlete.first_name} {athlete.last_name}',
-                'username': athlete.username
-            })
+    def get(self, request):
+        # ?size= - атлетов на челлендж, ?offset= - сколько атлетов пропустить, ?name= - только один челлендж
+        try:
+            size = int(request.query_params.get('size', self.DEFAULT_ATHLETES_SIZE))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        result = []
-        for full_name, athletes in summary.items():
-            result.append({
-                'name_to_display': full_name,
-                'athletes': athletes
-            })
+        if not 0 < size <= self.MAX_ATHLETES_SIZE or offset < 0:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(result)
+        return Response(challenges_summary(request.query_params.get('name'), offset, size))
 
 
 class RateCoachAPIView(APIView):
@@ -342,35 +458,99 @@ class RateCoachAPIView(APIView):
         updated_count = Subscription.objects.filter(coach=coach, athlete=athlete).update(rating=rating)
         if updated_count == 0:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        bump_model_versions(Subscription)  # update() не посылает post_save
+
+        update_coach_rating(coach.id)
 
         return Response(status=status.HTTP_200_OK)
 
 
 class CoachAnalyticsAPIView(APIView):
     def get(self, request, coach_id):
-        coach_qs = Subscription.objects.filter(coach=coach_id)
-
-        qs = coach_qs.annotate(max_distance=Max('athlete__run__distance'),
-                               sum_distance=Sum('athlete__run__distance'),
-                               avg_speed=Avg('athlete__run__speed')
-                               )
-
-        longest_run_qs = qs.order_by('-max_distance').first()
-        longest_run_user = longest_run_qs.athlete_id  # Id Бегуна, который сделал самый длинный забег у этого Тренера
-        longest_run_value = longest_run_qs.max_distance  # Дистанция самого длинного забега
-
-        total_run_qs = qs.order_by('-sum_distance').first()
-        total_run_user = total_run_qs.athlete_id  # Id Бегуна, который пробежал в сумме больше всех у этого Тренера
-        total_run_value = total_run_qs.sum_distance  # Дистанция которую в сумме пробежал этот Бегун
-
-        speed_avg_qs = qs.order_by('-avg_speed').first()
-        speed_avg_user = speed_avg_qs.athlete_id  # Id Бегуна который в среднем бежал быстрее всех
-        speed_avg_value = speed_avg_qs.avg_speed  # Средняя скорость этого Бегуна
-
-        return Response({'longest_run_user': longest_run_user,
-                         'longest_run_value': longest_run_value,
-                         'total_run_user': total_run_user,
-                         'total_run_value': total_run_value,
-                         'speed_avg_user': speed_avg_user,
-                         'speed_avg_value': speed_avg_value,
-                         })
+        return Response(coach_analytics(coach_id))
+
+
+class JobQueueStatsAPIView(APIView):
+    def get(self, request):
+        return Response(queue_depth(), status=status.HTTP_200_OK)
+
+
+class CacheStatsAPIView(APIView):
+    def get(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+class LeaderboardAPIView(APIView):
+    # ?coach=<id> - только атлеты тренера, ?athlete=<id> - место атлета. Место - это подсчет атлетов с большим
+    # значением по индексу, O(log n + место): дешево для лидеров, но для конца таблицы растет вместе с местом
+    def get(self, request, board):
+        if board not in BOARDS:
+            return Response({'error': f'Board should be one of: {", ".join(BOARDS)}'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            coach_id, athlete_id = (int(request.query_params[name]) if name in request.query_params else None
+                                    for name in ('coach', 'athlete'))
+        except ValueError:
+            return Response({'error': 'coach and athlete should be integer ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        field = BOARDS[board]
+        qs = board_queryset(coach_id)
+
+        paginator = KeysetPagination()
+        paginator.ordering = (f'-{field}', 'user_id')
+        rows = paginator.paginate_queryset(qs.select_related('user'), request, view=self)
+
+        data = paginator.get_paginated_response(rank_rows(field, rows, coach_id)).data
+        if athlete_id is not None:
+            data['me'] = my_rank(field, athlete_id, coach_id)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class TrainingSeriesAPIView(APIView):
+    DEFAULT_DAYS = 365
+    user_filter = {}  # Каких пользователей можно запрашивать
+    rollup_lookup = 'athlete_id'  # Поле агрегатов, по которому они отбираются для пользователя
+
+    def get_rollups(self, model, user_id):
+        get_object_or_404(User.objects.filter(**self.user_filter), id=user_id)
+        return model.objects.filter(**{self.rollup_lookup: user_id})
+
+    @staticmethod
+    def parse_date_param(request, name):
+        value = request.query_params.get(name)
+        if value is None:
+            return None
+        parsed = parse_date(value)  # ValueError для несуществующей даты, None для неверного формата
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+
+    def get(self, request, user_id):
+        # ?period=day|week, ?from=YYYY-MM-DD, ?to=YYYY-MM-DD (по умолчанию - последний год)
+        period = request.query_params.get('period', 'day')
+        if period not in ROLLUPS:
+            return Response({'error': f'Period should be one of: {", ".join(ROLLUPS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            date_to = self.parse_date_param(request, 'to') or timezone.localdate()
+            date_from = self.parse_date_param(request, 'from') or date_to - timedelta(days=self.DEFAULT_DAYS)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        if date_from > date_to:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        model, _ = ROLLUPS[period]
+        return Response(training_series(self.get_rollups(model, user_id), date_from, date_to),
+                        status=status.HTTP_200_OK)
+
+
+class AthleteTrainingAPIView(TrainingSeriesAPIView):
+    user_filter = {'is_staff': False}
+
+
+class CoachTrainingAPIView(TrainingSeriesAPIView):
+    # Суммарный ряд по всем атлетам, подписанным на тренера
+    user_filter = {'is_staff': True}
+    rollup_lookup = 'athlete__subscriptions__coach_id'
@@ -0,0 +1,17 @@
+import os
+
+import django
+
+# Точки входа для запуска по расписанию (события Zappa, cron). В продакшне нет постоянного воркера,
+# поэтому очередь задач разбирается раз в минуту командой run_jobs --once
+
+JOBS_RETENTION_DAYS = 7  # Сколько хранить выполненные задачи с idempotency key и упавшие задачи
+
+
+def run_jobs(event=None, context=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_run.settings')
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('run_jobs', '--once', '--purge-older-than', str(JOBS_RETENTION_DAYS))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app_run.middleware.CompressionMiddleware',  # До остальных middleware, которые читают или меняют ответ
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -119,3 +121,40 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 COMPANY_NAME = 'Run ForREST Run!'
 SLOGAN = 'From the couch to the finish line — together!'
 CONTACTS = 'Trchanje street 94/19, Belgrade'
+
+# Кеш (кеш ответов API, сводка челленджей, аналитика тренеров). Версии и инвалидации пишут и веб-процессы,
+# и воркеры очереди задач, поэтому кеш должен быть общим для всех процессов: задайте, например,
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и CACHE_LOCATION=redis://host:6379/0.
+# Без него кеш выключен (DummyCache): кеш в памяти процесса отдавал бы устаревшие ответы
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.dummy.DummyCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# JSON через orjson (если установлен) для всех ответов и запросов API
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'app_run.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'app_run.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Сжатие ответов (app_run/middleware.py): ответы меньше COMPRESSION_MIN_SIZE байт не сжимаются.
+# brotli используется, если установлен пакет brotli, иначе gzip
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5  # 0-11, выше - сильнее сжатие и дольше
+
+# Если True, списки забегов, пользователей и точек сериализуются напрямую из queryset.values()
+# (app_run/fast_serializers.py) - вывод тот же, но заметно быстрее на больших страницах
+FAST_LIST_SERIALIZATION = False
+
+# Фоновые задачи (app_run/jobs.py) выполняет воркер: python manage.py run_jobs.
+# Если True, задачи выполняются сразу в процессе веб-сервера, без воркера
+JOBS_RUN_EAGERLY = False
@@ -1,3 +1,5 @@
+import os
+
 from .base import *
 
 # Database
@@ -10,6 +12,16 @@ DATABASES = {
     }
 }
 
+JOBS_RUN_EAGERLY = True
+
+# Локально задачи выполняются в том же процессе, поэтому кеша в памяти процесса достаточно
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
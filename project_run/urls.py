@@ -21,7 +21,8 @@ from django.conf import settings
 from rest_framework.routers import DefaultRouter
 from app_run.views import company_details, RunViewSet, UserViewSet, StartRunAPIView, StopRunAPIView, AthleteInfoAPIView, \
     ChallengeAPIView, PositionViewSet, CollectibleItemViewSet, UploadFileView, SubscriptionAPIView, \
-    ChallengesSummaryAPIView, RateCoachAPIView, CoachAnalyticsAPIView
+    ChallengesSummaryAPIView, RateCoachAPIView, CoachAnalyticsAPIView, JobQueueStatsAPIView, \
+    ImportJobAPIView, LeaderboardAPIView, AthleteTrainingAPIView, CoachTrainingAPIView, CacheStatsAPIView
 
 router = DefaultRouter()
 router.register('api/runs', RunViewSet)
@@ -37,9 +38,15 @@ urlpatterns = [
     path('api/athlete_info/<int:user_id>/', AthleteInfoAPIView.as_view()),
     path('api/challenges/', ChallengeAPIView.as_view()),
     path('api/upload_file/', UploadFileView.as_view()),
+    path('api/upload_file/<int:job_id>/', ImportJobAPIView.as_view()),
     path('api/subscribe_to_coach/<int:id>/', SubscriptionAPIView.as_view()),
     path('api/challenges_summary/', ChallengesSummaryAPIView.as_view()),
     path('api/rate_coach/<int:coach_id>/', RateCoachAPIView.as_view()),
     path('api/analytics_for_coach/<int:coach_id>/', CoachAnalyticsAPIView.as_view()),
+    path('api/jobs/stats/', JobQueueStatsAPIView.as_view()),
+    path('api/cache/stats/', CacheStatsAPIView.as_view()),
+    path('api/leaderboard/<str:board>/', LeaderboardAPIView.as_view()),
+    path('api/athletes/<int:user_id>/training/', AthleteTrainingAPIView.as_view()),
+    path('api/coaches/<int:user_id>/training/', CoachTrainingAPIView.as_view()),
     path('', include(router.urls)),  # Всегда последний!
 ]